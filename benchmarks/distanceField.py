@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# ----------------------- #
+# Distance Field Accuracy #
+# ----------------------- #
+
+# -- Modules -- #
+import os
+import sys
+import random
+from math import sqrt
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'source', 'code'))
+
+from defcon import Font
+import simulation
+from collision import OutlineIndex, DistanceField
+from simulation import TOLERANCE, simulateBorder, glyphContourKeys, flattenedIndex
+from hotPaths import CORPUS, loadCorpus
+
+
+# -- Constants -- #
+FLATNESS = .01   # exact index
+MAX_DISTANCE = 100
+RESOLUTIONS = [.5, 1, 2, 4]
+QUERIES = 20000
+FIELD_RESOLUTIONS = [2, 4]    # finer fields take seconds to build for each glyph and bit
+BIT_SIZES = [.5, 1, 2]    # mm, at a body size of 90
+
+
+# -- Objects, Functions, Procedures -- #
+def drawReferenceGlyph(glyph):
+    pen = glyph.getPen()
+    # bowl with a counter
+    pen.moveTo((580, 300))
+    pen.curveTo((580, 455), (455, 580), (300, 580))
+    pen.curveTo((145, 580), (20, 455), (20, 300))
+    pen.curveTo((20, 145), (145, 20), (300, 20))
+    pen.curveTo((455, 20), (580, 145), (580, 300))
+    pen.closePath()
+    pen.moveTo((500, 300))
+    pen.curveTo((500, 190), (410, 100), (300, 100))
+    pen.curveTo((190, 100), (100, 190), (100, 300))
+    pen.curveTo((100, 410), (190, 500), (300, 500))
+    pen.curveTo((410, 500), (500, 410), (500, 300))
+    pen.closePath()
+    # hairline stem with sharp corners
+    pen.moveTo((700, 0))
+    pen.lineTo((703, 0))
+    pen.lineTo((703, 600))
+    pen.lineTo((700, 600))
+    pen.closePath()
+
+
+def countFieldMismatches(glyphs, resolution):
+    """Circles whose verdict with the field differs from the one with the
+       exact index, and among them the ones farther from tangency than the
+       error bound stated by simulateBorder. The circles sit a TOLERANCE from
+       tangency, so any lookup error would show up here"""
+    errorBound = resolution/sqrt(2) + resolution/4 + TOLERANCE/10
+    mismatches = violations = circles = 0
+    for eachGlyph in glyphs:
+        for bitSize in BIT_SIZES:
+            exact = simulateBorder(eachGlyph, bitSize=bitSize)
+            field = simulateBorder(eachGlyph, bitSize=bitSize, fieldResolution=resolution)
+            index = flattenedIndex(glyphContourKeys(eachGlyph), exact.bitUPM)
+            radius = exact.bitUPM/2
+            for eachCenter, a, b in zip(exact.iterCenters(), exact.touching, field.touching):
+                if a != b:
+                    mismatches += 1
+                    violations += abs(index.signedDistance(eachCenter, exact.bitUPM) - radius) > errorBound
+            violations += abs(len(exact) - len(field))
+            circles += len(exact)
+    return mismatches, violations, circles
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    font = Font()
+    font.info.unitsPerEm = 1000
+    glyph = font.newGlyph('reference')
+    drawReferenceGlyph(glyph)
+    index = OutlineIndex.fromGlyph(glyph, cellSize=MAX_DISTANCE, flatness=FLATNESS)
+
+    random.seed(0)
+    xMin, yMin, xMax, yMax = glyph.bounds
+    queries = [((random.uniform(xMin-MAX_DISTANCE, xMax+MAX_DISTANCE),
+                 random.uniform(yMin-MAX_DISTANCE, yMax+MAX_DISTANCE)),
+                random.uniform(1, MAX_DISTANCE)) for _ in range(QUERIES)]
+
+    start = perf_counter()
+    exact = [index.discIntersects(center, radius) for center, radius in queries]
+    exactTime = perf_counter() - start
+
+    failed = False
+    print(f"{'resolution':>10} {'build ms':>9} {'query us':>9} {'exact us':>9} {'disagree':>9} {'violations':>10}")
+    for resolution in RESOLUTIONS:
+        start = perf_counter()
+        field = DistanceField.fromGlyph(glyph, resolution, MAX_DISTANCE, flatness=resolution/4)
+        buildTime = perf_counter() - start
+
+        start = perf_counter()
+        verdicts = [field.discIntersects(center, radius) for center, radius in queries]
+        queryTime = perf_counter() - start
+
+        # the field may only disagree on discs closer to tangency than
+        # the bilinear error plus the flattening error
+        tolerance = resolution/sqrt(2) + resolution/4
+        disagreements = [(center, radius) for (center, radius), a, b in zip(queries, exact, verdicts) if a != b]
+        violations = [(center, radius) for center, radius in disagreements
+                      if abs(index.signedDistance(center, MAX_DISTANCE) - radius) > tolerance]
+        failed = failed or bool(violations)
+        print(f"{resolution:>10} {buildTime*1000:>9.1f} {queryTime/QUERIES*1e6:>9.2f} "
+              f"{exactTime/QUERIES*1e6:>9.2f} {len(disagreements):>9} {len(violations):>10}")
+
+    # the verdicts of simulateBorder, with EXACT_FIELD they all agree with the exact mode
+    glyphs = [glyph] + loadCorpus(CORPUS)
+    print(f"\n{'resolution':>10} {'exact':>6} {'circles':>9} {'mismatches':>10} {'violations':>10}")
+    for exactField in (False, True):
+        simulation.EXACT_FIELD = exactField
+        for resolution in FIELD_RESOLUTIONS:
+            mismatches, violations, circles = countFieldMismatches(glyphs, resolution)
+            failed = failed or bool(violations) or (exactField and bool(mismatches))
+            print(f"{resolution:>10} {exactField!s:>6} {circles:>9} {mismatches:>10} {violations:>10}")
+
+    sys.exit(1 if failed else 0)
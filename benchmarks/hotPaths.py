@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# ------------------- #
+# Hot Paths Benchmark #
+# ------------------- #
+
+# -- Modules -- #
+import os
+import sys
+import json
+import argparse
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'source', 'code'))
+
+from geometry import collectPointsOnLine, collectPointsOnBezierCurveWithFixedDistance, isTouching
+from collision import FlatteningPen, OutlineIndex
+from snapshot import GlyphSnapshot
+from simulation import simulateBorder, SimulationState, ContourBreakingPen
+from simulation import FROM_MM_TO_PT, TOLERANCE, EXACT_COLLISION
+
+
+# -- Constants -- #
+CORPUS = os.path.join(os.path.dirname(__file__), 'corpus', 'lato.json')
+BODY_SIZE = 90
+BIT_SIZES = [.5, 1, 3, 6]
+SLOWDOWN = 1.25   # tolerated ratio against a baseline
+NOISE = .0001     # seconds, smaller differences are timer noise
+PHASES = ['lines', 'curves', 'isTouching', 'simulateBorder']
+
+
+# -- Objects, Functions, Procedures -- #
+def loadCorpus(path):
+    """Glyphs stored as JSON recordings, one list of (operator, points)
+       for each contour. GlyphSnapshot stands for the glyph, it has the
+       draw and pointInside methods used by the simulation"""
+    with open(path) as jsonFile:
+        corpus = json.load(jsonFile)
+    glyphs = []
+    for glyphName, contours in corpus['glyphs'].items():
+        recordings = [tuple((operator, tuple(tuple(pt) for pt in points)) for operator, points in eachContour)
+                      for eachContour in contours]
+        glyphs.append(GlyphSnapshot(recordings, corpus['unitsPerEm'], name=glyphName))
+    return glyphs
+
+
+def collectSegments(glyph):
+    lines, curves = [], []
+    for eachContour in glyph:
+        for operator, points in eachContour.recording:
+            if operator == 'moveTo':
+                firstPt = currentPt = points[0]
+            elif operator == 'lineTo':
+                lines.append((currentPt, points[0]))
+                currentPt = points[0]
+            elif operator == 'curveTo':
+                curves.append((currentPt, *points))
+                currentPt = points[-1]
+            elif operator == 'closePath':
+                lines.append((currentPt, firstPt))
+    return lines, curves
+
+
+def bestOf(function, number):
+    return min(repeat(function, number=number, repeat=3)) / number
+
+
+def benchmarkGlyph(glyph, bitSize, number):
+    """Seconds per call and samples produced for each phase"""
+    bitUPM = glyph.font.info.unitsPerEm * bitSize * FROM_MM_TO_PT / BODY_SIZE
+    pen = ContourBreakingPen(bitUPM)
+    lines, curves = collectSegments(glyph)
+
+    def sampleLines():
+        return [collectPointsOnLine(pt1, pt2, pen.relativeDistance) for pt1, pt2 in lines]
+
+    def sampleCurves():
+        return [collectPointsOnBezierCurveWithFixedDistance(*eachCurve, pen.relativeDistance, flatness=pen.flatness)
+                for eachCurve in curves]
+
+    def simulate():
+        return simulateBorder(glyph, BODY_SIZE, bitSize, state=SimulationState())
+
+    simulation = simulate()
+    radius = bitUPM/2
+    centers = list(simulation.iterCenters())
+    flatteningPen = FlatteningPen(flatness=TOLERANCE/10)
+    glyph.draw(flatteningPen)
+    index = OutlineIndex(flatteningPen.contours, cellSize=bitUPM)
+
+    def touch():
+        return [isTouching(eachCenter, radius, glyph, index=index, exact=EXACT_COLLISION) for eachCenter in centers]
+
+    return {
+        'lines': (bestOf(sampleLines, number*10), sum(len(eachPoints) for eachPoints in sampleLines())),
+        'curves': (bestOf(sampleCurves, number), sum(len(eachPoints) for eachPoints in sampleCurves())),
+        'isTouching': (bestOf(touch, number), len(centers)),
+        'simulateBorder': (bestOf(simulate, number), len(centers)),
+        'errors': simulation.errorCount,
+    }
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the sampling and collision hot paths on a glyph corpus")
+    parser.add_argument('--corpus', default=CORPUS, help="JSON corpus of glyph outlines")
+    parser.add_argument('--number', type=int, default=5, help="calls for each timing")
+    parser.add_argument('--save', default=None, help="write the timings to this JSON file")
+    parser.add_argument('--compare', default=None,
+                        help=f"JSON file saved by a previous run, fail if any phase is {SLOWDOWN}x slower")
+    args = parser.parse_args()
+
+    print(f"{'glyph':>10} {'bit mm':>6} " + ' '.join(f"{eachPhase:>20}" for eachPhase in PHASES) + f" {'errors':>6}")
+    timings = {}
+    for eachGlyph in loadCorpus(args.corpus):
+        for bitSize in BIT_SIZES:
+            results = benchmarkGlyph(eachGlyph, bitSize, args.number)
+            cells = ' '.join(f"{results[eachPhase][0]*1000:>10.3f}ms {results[eachPhase][1]:>6}pt" for eachPhase in PHASES)
+            print(f"{eachGlyph.name:>10} {bitSize:>6} {cells} {results['errors']:>6}")
+            timings[f"{eachGlyph.name} {bitSize}"] = {eachPhase: results[eachPhase][0] for eachPhase in PHASES}
+
+    if args.save:
+        with open(args.save, 'w') as jsonFile:
+            json.dump(timings, jsonFile, indent=2)
+
+    if args.compare:
+        with open(args.compare) as jsonFile:
+            baseline = json.load(jsonFile)
+        slower = [(key, eachPhase, timings[key][eachPhase] / baseline[key][eachPhase])
+                  for key in timings.keys() & baseline.keys()
+                  for eachPhase in PHASES
+                  if timings[key][eachPhase] > max(baseline[key][eachPhase] * SLOWDOWN,
+                                                   baseline[key][eachPhase] + NOISE)]
+        for key, eachPhase, ratio in sorted(slower):
+            print(f"{key}: {eachPhase} is {ratio:.2f}x slower than the baseline")
+        sys.exit(1 if slower else 0)
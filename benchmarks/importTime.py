@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+# ------------------ #
+# Import Time Budget #
+# ------------------ #
+
+# -- Modules -- #
+import os
+import sys
+import json
+import argparse
+import subprocess
+from statistics import median
+
+
+# -- Constants -- #
+SOURCE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'source', 'code')
+RUNS = 10
+
+# module: (budget in ms, top level packages it must not import)
+BUDGETS = {
+    'simulation': (100, ['mojo', 'vanilla', 'AppKit', 'PyObjCTools', 'defcon', 'numpy']),
+    'batch': (250, ['mojo', 'vanilla', 'AppKit', 'PyObjCTools']),
+}
+
+CHILD = """
+import sys, json
+from time import perf_counter
+before = set(sys.modules)
+start = perf_counter()
+import {module}
+elapsed = perf_counter() - start
+print(json.dumps([elapsed, sorted(set(sys.modules) - before)]))
+"""
+
+
+# -- Objects, Functions, Procedures -- #
+def measureImport(module):
+    """Imports module in a fresh interpreter, returns the elapsed
+       seconds and the names of the modules it loaded"""
+    output = subprocess.run([sys.executable, '-c', CHILD.format(module=module)],
+                            cwd=SOURCE_FOLDER, check=True, capture_output=True, text=True).stdout
+    elapsed, loaded = json.loads(output)
+    return elapsed, loaded
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the import time of the headless modules")
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--scale', type=float, default=1,
+                        help="multiply the budgets, for slow machines")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<12}{'best':>10}{'median':>10}{'budget':>10}")
+    for module, (budget, forbidden) in BUDGETS.items():
+        timings = []
+        for eachRun in range(args.runs):
+            elapsed, loaded = measureImport(module)
+            timings.append(elapsed*1000)
+
+        best = min(timings)
+        print(f"{module:<12}{best:>8.1f}ms{median(timings):>8.1f}ms{budget*args.scale:>8.0f}ms")
+        if best > budget*args.scale:
+            failures.append(f"{module} takes {best:.1f}ms to import, budget is {budget*args.scale:.0f}ms")
+
+        leaked = sorted({eachName.split('.')[0] for eachName in loaded} & set(forbidden))
+        if leaked:
+            failures.append(f"{module} imports {', '.join(leaked)}")
+
+    for eachFailure in failures:
+        print(eachFailure)
+    sys.exit(1 if failures else 0)
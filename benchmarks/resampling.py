@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# --------------------- #
+# Resampling Benchmark  #
+# --------------------- #
+
+# -- Modules -- #
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'source', 'code'))
+
+from geometry import collectPointsOnBezierCurve, collectPointsOnBezierCurveWithFixedDistance
+from geometry import calcDistance
+
+
+# -- Constants -- #
+FROM_MM_TO_PT = 2.834627813
+DISTANCE = .2
+DISTANCE_THRESHOLD = 6
+
+UNITS_PER_EM = 1000
+BODY_SIZE = 90
+BIT_SIZES = [.5, 1, 2, 3, 4, 5, 6]
+
+CURVES = {
+    'serif': ((0, 0), (3, 0), (5, 2), (5, 5)),
+    'shoulder': ((130, 380), (160, 440), (220, 460), (280, 460)),
+    'bowl': ((560, 300), (560, 760), (40, 760), (40, 300)),
+    's-spine': ((80, 120), (600, 120), (-100, 620), (500, 640)),
+}
+
+
+# -- Objects, Functions, Procedures -- #
+def legacyFixedDistance(pt1, pt2, pt3, pt4, distance):
+    """The forward scan used before the arc length resampling, kept as reference"""
+    rawPoints = collectPointsOnBezierCurve(pt1, pt2, pt3, pt4, 1000)
+
+    index = 0
+    cleanPoints = []
+    while index < len(rawPoints):
+        eachPt, tStep = rawPoints[index]
+        cleanPoints.append(eachPt)
+        for progress in range(1, len(rawPoints) - index):
+            if calcDistance(eachPt, rawPoints[index + progress][0]) >= distance:
+                index = index + progress
+                break
+        else:
+            break
+
+    if rawPoints[-1] not in cleanPoints:
+        cleanPoints.append(rawPoints[-1][0])
+
+    return cleanPoints
+
+
+def relativeDistance(bitSize):
+    bitUPM = UNITS_PER_EM * bitSize * FROM_MM_TO_PT / BODY_SIZE
+    return max(int(DISTANCE*bitUPM), DISTANCE_THRESHOLD)
+
+
+def bestOf(function, *args, number=20):
+    return min(repeat(lambda: function(*args), number=number, repeat=3)) / number
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    print(f"{'curve':>10} {'bit mm':>7} {'legacy ms':>10} {'arc ms':>8} {'speedup':>8} {'points':>11}")
+    for curveName, curve in CURVES.items():
+        for bitSize in BIT_SIZES:
+            distance = relativeDistance(bitSize)
+            legacyTime = bestOf(legacyFixedDistance, *curve, distance)
+            arcTime = bestOf(collectPointsOnBezierCurveWithFixedDistance, *curve, distance)
+            legacyCount = len(legacyFixedDistance(*curve, distance))
+            arcCount = len(collectPointsOnBezierCurveWithFixedDistance(*curve, distance))
+            print(f"{curveName:>10} {bitSize:>7} {legacyTime*1000:>10.3f} {arcTime*1000:>8.3f} "
+                  f"{legacyTime/arcTime:>7.1f}x {legacyCount:>5}/{arcCount:<5}")
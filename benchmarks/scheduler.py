@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# ------------------------ #
+# Scheduler Cancel & Order #
+# ------------------------ #
+
+# -- Modules -- #
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'source', 'code'))
+
+from scheduler import SimulationScheduler, SimulationCancelled
+
+
+# -- Constants -- #
+SUBMITS = 20
+
+
+# -- Objects, Functions, Procedures -- #
+class FakeSubscriber:
+    """Stands in for the glyph editor: compute blocks until released or
+       cancelled, deliver records what would have been drawn"""
+
+    def __init__(self):
+        self.delivered = []
+        self.cancelled = []
+        self.started = threading.Event()
+        self.dropped = threading.Event()
+        self.release = threading.Event()
+
+    def compute(self, value, isCancelled):
+        self.started.set()
+        while not self.release.wait(.001):
+            if isCancelled():
+                self.cancelled.append(value)
+                self.dropped.set()
+                raise SimulationCancelled
+        return value
+
+    def deliver(self, result):
+        self.delivered.append(result)
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    subscriber = FakeSubscriber()
+    scheduler = SimulationScheduler(subscriber.compute, subscriber.deliver)
+    # the first job is running when the others supersede it
+    scheduler.submit(0)
+    assert subscriber.started.wait(timeout=5)
+    for value in range(1, SUBMITS):
+        scheduler.submit(value)
+    assert subscriber.dropped.wait(timeout=5)
+    subscriber.release.set()
+    assert scheduler.waitUntilIdle(timeout=5)
+    scheduler.stop()
+
+    print(f"delivered {subscriber.delivered}, cancelled while running {subscriber.cancelled}")
+    assert subscriber.delivered == [SUBMITS-1], subscriber.delivered
+    assert subscriber.cancelled == [0], subscriber.cancelled
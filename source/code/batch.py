@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# -------------------- #
+# Batch CAM Simulation #
+# -------------------- #
+
+"""Simulates every glyph of one or more UFOs without RoboFont.
+
+   python3 batch.py Regular.ufo Bold.ufo --bodySize 90 --bitSize 1 -o report.json
+
+   With --bitSizes every glyph is simulated at each of the sizes, and the
+   report gives the errors left by each and the largest error-free size.
+
+   Glyphs are spread over a pool of processes, each process opens the
+   fonts once and keeps them for all the glyphs it receives"""
+
+# -- Modules -- #
+import sys
+import csv
+import json
+import argparse
+
+from defcon import Font
+
+from commandLine import glyphOrder, workerParameters, openOnce, mapInOrder, addArguments, outputFormat, openOutput
+from simulation import getSimulation, SimulationState, SimulationStats
+from sweep import sweepBitSizes, largestErrorFreeBitSize
+from reach import calcReachMap
+from cache import SimulationCache
+from store import SimulationStore
+
+
+# -- Constants -- #
+CHUNK_SIZE = 8
+CSV_FIELDS = ['font', 'glyph', 'circles', 'errors', 'x', 'y']
+SWEEP_CSV_FIELDS = ['font', 'glyph', 'bitSize', 'circles', 'errors']
+
+
+# -- Objects, Functions, Procedures -- #
+_noCache = SimulationCache(maxBytes=0)   # every glyph is simulated once
+
+
+def simulateGlyph(task):
+    path, glyphName = task
+    glyph = openOnce(Font, path)[glyphName]
+    parameters = dict(workerParameters)
+    stats = SimulationStats(glyphName) if parameters.pop('profile') else None
+    unreachable = parameters.pop('unreachable')
+    bitSizes = parameters.pop('bitSizes')
+    reach = parameters.pop('reach')
+    storePath = parameters.pop('storePath')
+    parameters['store'] = openOnce(SimulationStore, storePath) if storePath else None
+    if bitSizes:
+        return path, glyphName, sweepGlyph(glyph, bitSizes, **parameters)
+
+    state = SimulationState()
+    simulation = getSimulation(glyph, state=state, stats=stats, cache=_noCache, **parameters)
+    glyphReport = {'circles': len(simulation),
+                   'errors': list(simulation.iterCenters(touching=True))}
+    # a result loaded from the store was not simulated, it has nothing to profile
+    if stats is not None and state.stats is stats:
+        glyphReport['stats'] = stats.asDict()
+    if unreachable:
+        # pyclipper is only needed here
+        from toolPath import ToolPath
+        glyphReport['unreachableArea'] = ToolPath(glyph, simulation).unreachableArea
+    if reach:
+        reachMap = calcReachMap(glyph, parameters['bodySize'], parameters['bitSize'])
+        glyphReport['reach'] = [(x, y, round(bitSize, 3)) for (x, y), bitSize in reachMap.iterBitSizes(parameters['bodySize'])]
+    return path, glyphName, glyphReport
+
+
+def sweepGlyph(glyph, bitSizes, bodySize, bitSize, fieldResolution, store=None):
+    simulations = sweepBitSizes(glyph, bitSizes, bodySize, fieldResolution, cache=_noCache, store=store)
+    sweep = {bitSize: {'circles': len(eachSimulation), 'errors': eachSimulation.errorCount}
+             for bitSize, eachSimulation in simulations.items()}
+    largest = largestErrorFreeBitSize({bitSize: eachReport['errors'] for bitSize, eachReport in sweep.items()})
+    return {'sweep': sweep, 'largestErrorFree': largest}
+
+
+def collectTasks(paths, glyphNames=None):
+    tasks = []
+    for eachPath in paths:
+        for eachName in glyphOrder(Font(eachPath)):
+            if glyphNames and eachName not in glyphNames:
+                continue
+            tasks.append((eachPath, eachName))
+    return tasks
+
+
+def simulateFonts(paths, bodySize=90, bitSize=1, fieldResolution=None, glyphNames=None, workers=None,
+                  profile=False, unreachable=False, storePath=None, bitSizes=None, reach=False):
+    """Returns {path: {glyphName: {'circles': int, 'errors': [(x, y), ...]}}},
+       errors are the centres of the circles touching the outline.
+       With profile each simulated glyph also gets the timings and counts of its simulation,
+       glyphs loaded from the store have none,
+       with unreachable the area left by the tool around its outline, in square units,
+       with reach the largest bit in mm that fits at each sample, as [x, y, bitSize].
+       With a storePath, results are read from and saved to that SimulationStore.
+
+       With bitSizes, bitSize is ignored and each glyph gets instead
+       {'sweep': {bitSize: {'circles': int, 'errors': int}}, 'largestErrorFree': bitSize or None}"""
+    tasks = collectTasks(paths, glyphNames)
+    parameters = dict(bodySize=bodySize, bitSize=bitSize, fieldResolution=fieldResolution, profile=profile,
+                      unreachable=unreachable, storePath=storePath, bitSizes=bitSizes, reach=reach)
+    report = {eachPath: {} for eachPath in paths}
+    for path, glyphName, glyphReport in mapInOrder(simulateGlyph, tasks, parameters, workers, CHUNK_SIZE):
+        report[path][glyphName] = glyphReport
+    return report
+
+
+def writeJSON(report, stream, bodySize, bitSize):
+    json.dump({'bodySize': bodySize, 'bitSize': bitSize, 'fonts': report}, stream, indent=2)
+    stream.write('\n')
+
+
+def writeSweepJSON(report, stream, bodySize, bitSizes):
+    # a font is as fine as its coarsest glyph
+    fonts = {}
+    for eachPath, glyphs in report.items():
+        largest = [eachGlyph['largestErrorFree'] for eachGlyph in glyphs.values()]
+        fonts[eachPath] = {'largestErrorFree': None if None in largest else min(largest, default=None),
+                           'glyphs': glyphs}
+    json.dump({'bodySize': bodySize, 'bitSizes': bitSizes, 'fonts': fonts}, stream, indent=2)
+    stream.write('\n')
+
+
+def writeCSV(report, stream):
+    # one row for each error, glyphs without errors get a single row without coordinates
+    writer = csv.writer(stream)
+    writer.writerow(CSV_FIELDS)
+    for eachPath, glyphs in report.items():
+        for glyphName, glyphReport in glyphs.items():
+            row = [eachPath, glyphName, glyphReport['circles'], len(glyphReport['errors'])]
+            if not glyphReport['errors']:
+                writer.writerow(row + ['', ''])
+            for x, y in glyphReport['errors']:
+                writer.writerow(row + [round(x, 3), round(y, 3)])
+
+
+def writeSweepCSV(report, stream):
+    # one row for each glyph and bit size
+    writer = csv.writer(stream)
+    writer.writerow(SWEEP_CSV_FIELDS)
+    for eachPath, glyphs in report.items():
+        for glyphName, glyphReport in glyphs.items():
+            for bitSize, eachReport in glyphReport['sweep'].items():
+                writer.writerow([eachPath, glyphName, bitSize, eachReport['circles'], eachReport['errors']])
+
+
+def parseArguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Simulate the milling of every glyph in one or more UFOs")
+    parser.add_argument('fonts', nargs='+', help="UFO paths")
+    addArguments(parser, 'bodySize', 'bitSize')
+    parser.add_argument('--bitSizes', type=float, nargs='+', default=None, metavar='BITSIZE',
+                        help="sweep these bit diameters in mm instead of --bitSize")
+    addArguments(parser, 'fieldResolution', 'glyphs', 'workers')
+    parser.add_argument('--profile', action='store_true',
+                        help="add the timings and counts of each simulation to the JSON report")
+    parser.add_argument('--unreachable', action='store_true',
+                        help="add the area the tool cannot reach around each glyph to the JSON report")
+    parser.add_argument('--reach', action='store_true',
+                        help="add the largest bit that fits at each point of the outline to the JSON report")
+    addArguments(parser, 'cache', 'format', 'output')
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parseArguments(arguments)
+    report = simulateFonts(args.fonts, args.bodySize, args.bitSize, fieldResolution=args.fieldResolution,
+                           glyphNames=set(args.glyphs) if args.glyphs else None, workers=args.workers,
+                           profile=args.profile, unreachable=args.unreachable, storePath=args.cache,
+                           bitSizes=args.bitSizes, reach=args.reach)
+
+    with openOutput(args.output, newline='') as stream:
+        if outputFormat(args) == 'csv':
+            if args.bitSizes:
+                writeSweepCSV(report, stream)
+            else:
+                writeCSV(report, stream)
+        else:
+            if args.bitSizes:
+                writeSweepJSON(report, stream, args.bodySize, args.bitSizes)
+            else:
+                writeJSON(report, stream, args.bodySize, args.bitSize)
+
+    if args.bitSizes:
+        # a glyph that no swept size can mill is an error
+        errors = sum(eachGlyph['largestErrorFree'] is None for eachFont in report.values() for eachGlyph in eachFont.values())
+    else:
+        errors = sum(len(eachGlyph['errors']) for eachFont in report.values() for eachGlyph in eachFont.values())
+    return 1 if errors else 0
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# ---------------- #
+# Simulation Cache #
+# ---------------- #
+
+# -- Modules -- #
+import sys
+import threading
+from collections import OrderedDict
+
+
+# -- Constants -- #
+MAX_BYTES = 128 * 2**20
+
+
+# -- Objects, Functions, Procedures -- #
+def keyBytes(key):
+    """Memory held by a key of nested tuples, outline recordings included.
+       Items shared with other keys or values are counted again"""
+    size = sys.getsizeof(key)
+    if isinstance(key, tuple):
+        size += sum(keyBytes(eachItem) for eachItem in key)
+    return size
+
+
+class SimulationCache:
+    """Least recently used results shared by all the glyphs, bounded by
+       the sum of their nbytes and of the size of their keys. Values are computed outside of the lock,
+       so two threads asking for the same missing key may both compute it"""
+
+    def __init__(self, maxBytes=MAX_BYTES):
+        self.maxBytes = maxBytes
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, factory):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+
+        value = factory()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = value.nbytes + keyBytes(key)
+        with self._lock:
+            if key in self._items:
+                self.currentBytes -= self._items.pop(key)[1]
+            if size > self.maxBytes:
+                return
+            self._items[key] = value, size
+            self.currentBytes += size
+            while self.currentBytes > self.maxBytes:
+                _, (_, evictedSize) = self._items.popitem(last=False)
+                self.currentBytes -= evictedSize
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.currentBytes = 0
+
+    def __str__(self):
+        return (f"cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.currentBytes / 2**20:.1f} of {self.maxBytes / 2**20:.0f} MB")
+
+
+simulationCache = SimulationCache()
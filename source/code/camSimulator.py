@@ -6,108 +6,70 @@
 
 
 # -- Modules -- #
-from math import radians
-
-from vanilla import FloatingWindow, TextBox, EditText, Button, HorizontalLine, CheckBox
-from mojo.roboFont import OpenWindow
+from vanilla import FloatingWindow, Window, TextBox, EditText, Button, HorizontalLine, CheckBox
+from merz import MerzView
+from mojo.roboFont import OpenWindow, CurrentGlyph, CurrentFont
 from mojo.subscriber import WindowController, Subscriber
 from mojo.subscriber import registerGlyphEditorSubscriber
 from mojo.subscriber import unregisterGlyphEditorSubscriber
 from mojo.events import postEvent
-from defcon import registerRepresentationFactory
-from defcon.objects.glyph import Glyph
-from fontTools.pens.basePen import BasePen
+from PyObjCTools.AppHelper import callAfter
 
 from events import DEBUG_MODE, DEFAULT_KEY
-from geometry import collectPointsOnLine, collectPointsOnBezierCurveWithFixedDistance
-from geometry import projectPoint, isTouching, calcAngle
+from scheduler import SimulationScheduler
+from snapshot import GlyphSnapshot
+from simulation import getSimulation, SimulationState, PROFILING, FROM_MM_TO_PT
+from geometry import unpackPoints
+from cache import simulationCache
+from store import SimulationStore
+from sweep import sweepGlyphs
+from reach import getReachMap
+from textLine import simulateLine, layoutGlyphs, glyphNamesForText
 
 
 # -- Constants -- #
-FROM_MM_TO_PT = 2.834627813
-
-TOLERANCE = .1   # upm
-DISTANCE = .2    # percentage of bit radius
-DISTANCE_THRESHOLD = 6
-
 WHITE = (1, 1, 1, 1)
 BLACK = (0, 0, 0, 1)
 CIRCLE_COLOR = (0, 1, 0, .4)
 ERROR_COLOR = (1, 0, 0, .4)
+REACH_STEPS = 8    # colours of the reach heatmap, each drawn as one shared symbol
+REACH_DOT = 12     # thousandths of the em
 
+PERSISTENT_CACHE = True   # keep the results on disk between sessions
 
-# -- Objects -- #
-class ContourBreakingPen(BasePen):
 
-    def __init__(self, bitUPM):
-        super().__init__({})
-        if DISTANCE*bitUPM > DISTANCE_THRESHOLD:
-            self.relativeDistance = int(DISTANCE*bitUPM)
+# -- Objects -- #
+def drawSymbols(layer, simulation, touching, color):
+    # Merz renders the symbol once and reuses it for every circle with the same settings
+    imageSettings = dict(name="oval", size=(simulation.bitUPM, simulation.bitUPM), fillColor=color)
+    with layer.sublayerGroup():
+        for eachCenter in simulation.iterCenters(touching):
+            layer.appendSymbolSublayer(position=eachCenter,
+                                       imageSettings=imageSettings)
+
+
+def drawToolPath(layer, simulation, touching, color):
+    # the circles of a run overlap, so the run is the path swept by the tool:
+    # a line through their centres stroked as wide as the bit, with round ends
+    pathLayer = layer.appendPathSublayer(fillColor=None,
+                                         strokeColor=color,
+                                         strokeWidth=simulation.bitUPM,
+                                         strokeCap="round",
+                                         strokeJoin="round")
+    pen = pathLayer.getPen()
+    for eachRun, closed in simulation.iterRuns(touching):
+        pen.moveTo(eachRun[0])
+        for eachPt in eachRun[1:] or eachRun:
+            pen.lineTo(eachPt)
+        if closed:
+            pen.closePath()
         else:
-            self.relativeDistance = DISTANCE_THRESHOLD
-
-    def moveTo(self, pt):
-        self.points = []
-        self._firstPt = pt
-        self._prevPt = pt
-
-    def lineTo(self, pt):
-        self.points.extend(
-            collectPointsOnLine(self._prevPt,
-                                pt,
-                                self.relativeDistance)
-        )
-        self._prevPt = pt
-
-    def curveTo(self, pt1, pt2, pt3):
-        self.points.extend(
-            collectPointsOnBezierCurveWithFixedDistance(self._prevPt,
-                                                        pt1,
-                                                        pt2,
-                                                        pt3,
-                                                        self.relativeDistance)
-        )
-        self._prevPt = pt3
-
-    def closePath(self):
-        self.points.extend(
-            collectPointsOnLine(self._prevPt,
-                                self._firstPt,
-                                self.relativeDistance)
-        )
-        self._prevPt = None
-
-
-FACTORY_NAME = f"{DEFAULT_KEY}.simulateBorder"
-def simulateBorder(glyph, bodySize=90, bitSize=1):
-    assert bodySize > 0 or bodySize is not None
-    assert bitSize > 0 or bitSize is not None
-    bitUPM = glyph.font.info.unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize
-
-    simulationCircles = []
-    errorCircles = []
-
-    for eachContour in glyph:
-        pen = ContourBreakingPen(bitUPM)
-        eachContour.draw(pen)
-
-        previousPt = None
-        for indexPt, eachPt in enumerate(pen.points):
-            if indexPt != 0 and eachPt != previousPt:
-                angle = calcAngle(previousPt, eachPt)
-
-                offsetPointTolerance = projectPoint(point=eachPt,
-                                                    angle=angle+radians(-90),
-                                                    distance=bitUPM/2 + TOLERANCE)
-
-                if not isTouching(offsetPointTolerance, bitUPM/2, glyph):
-                    simulationCircles.append((offsetPointTolerance[0]-bitUPM/2, offsetPointTolerance[1]-bitUPM/2))
-                else:
-                    errorCircles.append((offsetPointTolerance[0]-bitUPM/2, offsetPointTolerance[1]-bitUPM/2))
-
-            previousPt = eachPt
-
-    return bitUPM, simulationCircles, errorCircles
+            pen.endPath()
+
+
+def reachColor(factor):
+    """From red at 0 through yellow to green at 1"""
+    return (min(1, 2 - 2*factor), min(1, 2*factor), 0, .8)
 
 
 class CAMSimulatorController(WindowController):
@@ -116,8 +78,14 @@ class CAMSimulatorController(WindowController):
     previewOn = False
     bodySize = 90
     bitSize = 1
+    fieldResolution = None
     showSimulation = True
     showErrors = True
+    mergeCircles = True
+    showReach = False
+    store = None
+    lineController = None
+    sweepSizes = [.5, 1, 1.5, 2, 3]
 
     def build(self):
         pluginWidth = 200
@@ -136,6 +104,8 @@ class CAMSimulatorController(WindowController):
         EditTextHeight = 22
         ButtonHeight = 20
         CheckBoxHeight = 22
+        StatsHeight = 190
+        SweepHeight = 42
 
         # init window
         self.w = FloatingWindow((pluginWidth, pluginHeight), "CAM Simulator")
@@ -189,6 +159,20 @@ class CAMSimulatorController(WindowController):
                                         value=self.showErrors,
                                         callback=self.errorsCheckCallback)
 
+        # merge circles checkbox
+        jumpingY += CheckBoxHeight
+        self.w.mergeCheck = CheckBox((marginLft, jumpingY, netWidth, CheckBoxHeight),
+                                       "Merge circles",
+                                       value=self.mergeCircles,
+                                       callback=self.mergeCheckCallback)
+
+        # show reach checkbox
+        jumpingY += CheckBoxHeight
+        self.w.reachCheck = CheckBox((marginLft, jumpingY, netWidth, CheckBoxHeight),
+                                       "Show largest bit",
+                                       value=self.showReach,
+                                       callback=self.reachCheckCallback)
+
         # separation line
         jumpingY += EditTextHeight + marginRow
         self.w.separationLine = HorizontalLine((marginLft, jumpingY, netWidth, 1))
@@ -200,6 +184,48 @@ class CAMSimulatorController(WindowController):
                                         "Preview On",
                                         callback=self.previewButtonCallback)
 
+        # separation line
+        jumpingY += ButtonHeight + marginRow
+        self.w.sweepLine = HorizontalLine((marginLft, jumpingY, netWidth, 1))
+
+        # sweep caption
+        jumpingY += marginRow
+        self.w.sweepCaption = TextBox((marginLft, jumpingY, netWidth*.38, TextBoxHeight),
+                                      "bitSizes:",
+                                      alignment="right")
+
+        # sweep edit
+        jumpingX = marginLft + netWidth*.42
+        self.w.sweepEdit = EditText((jumpingX, jumpingY, netWidth*.58, EditTextHeight),
+                                    text=" ".join(f"{eachSize:g}" for eachSize in self.sweepSizes),
+                                    callback=self.sweepEditCallback)
+
+        # sweep buttons
+        jumpingY += EditTextHeight + marginRow
+        self.w.sweepGlyphButton = Button((marginLft, jumpingY, netWidth/2 - marginCol, ButtonHeight),
+                                         "Sweep glyph",
+                                         callback=self.sweepGlyphButtonCallback)
+        self.w.sweepFontButton = Button((marginLft + netWidth/2 + marginCol, jumpingY, netWidth/2 - marginCol, ButtonHeight),
+                                        "Sweep font",
+                                        callback=self.sweepFontButtonCallback)
+
+        # text line window
+        jumpingY += ButtonHeight + marginRow
+        self.w.lineButton = Button((marginLft, jumpingY, netWidth, ButtonHeight),
+                                   "Simulate text line",
+                                   callback=self.lineButtonCallback)
+
+        # largest error-free bit of the last sweep
+        jumpingY += ButtonHeight + marginRow
+        self.w.sweepResultCaption = TextBox((marginLft, jumpingY, netWidth, SweepHeight), "", sizeStyle="small")
+        jumpingY += SweepHeight - ButtonHeight
+
+        # timings of the last simulation
+        if PROFILING:
+            jumpingY += ButtonHeight + marginRow
+            self.w.statsCaption = TextBox((marginLft, jumpingY, netWidth, StatsHeight), "", sizeStyle="mini")
+            jumpingY += StatsHeight - ButtonHeight
+
         # adjust window height
         jumpingY += ButtonHeight + marginBtm
         self.w.setPosSize((0, 0, pluginWidth, jumpingY))
@@ -208,12 +234,46 @@ class CAMSimulatorController(WindowController):
         self.w.open()
 
     def started(self):
+        if PERSISTENT_CACHE:
+            self.store = SimulationStore()
+        # sweeps run on their own worker thread, next to the simulations of the glyph editors
+        self.sweepScheduler = SimulationScheduler(sweepGlyphs, self.showSweep, dispatch=callAfter)
         CAMSimulatorSubscriber.controller = self
         registerGlyphEditorSubscriber(CAMSimulatorSubscriber)
 
     def destroy(self):
         CAMSimulatorSubscriber.controller = None
         unregisterGlyphEditorSubscriber(CAMSimulatorSubscriber)
+        self.sweepScheduler.stop()
+        if self.lineController is not None:
+            self.lineController.w.close()
+        if self.store is not None:
+            self.store.close()
+
+    def showStats(self, stats):
+        if PROFILING:
+            lines = [str(eachRecord) for eachRecord in (stats, simulationCache, self.store) if eachRecord is not None]
+            self.w.statsCaption.set("\n".join(lines))
+
+    def sweep(self, glyphs):
+        if not glyphs:
+            return
+        self.w.sweepResultCaption.set("Sweeping...")
+        self.sweepScheduler.submit([GlyphSnapshot.fromGlyph(eachGlyph) for eachGlyph in glyphs],
+                                   self.sweepSizes,
+                                   bodySize=self.bodySize,
+                                   fieldResolution=self.fieldResolution,
+                                   store=self.store)
+
+    def showSweep(self, largestSizes):
+        # a font is as fine as its coarsest glyph
+        unmilled = [glyphName for glyphName, bitSize in largestSizes.items() if bitSize is None]
+        if unmilled:
+            self.w.sweepResultCaption.set(f"No size without errors: {' '.join(unmilled)}")
+            return
+        largest = min(largestSizes.values())
+        limiting = [glyphName for glyphName, bitSize in largestSizes.items() if bitSize == largest]
+        self.w.sweepResultCaption.set(f"Largest error-free bit: {largest:g} mm\nLimited by: {' '.join(limiting)}")
 
     # callbacks
     def bodyEditCallback(self, sender):
@@ -223,6 +283,8 @@ class CAMSimulatorController(WindowController):
             self.bodySize = 90
             self.w.bodyEdit.set("90")
         postEvent(f"{DEFAULT_KEY}.bodySizeDidChange")
+        if self.lineController is not None:
+            self.lineController.simulate()
 
     def bitEditCallback(self, sender):
         try:
@@ -231,6 +293,8 @@ class CAMSimulatorController(WindowController):
             self.bitSize = 1
             self.w.bitEdit.set("1")
         postEvent(f"{DEFAULT_KEY}.bitSizeDidChange")
+        if self.lineController is not None:
+            self.lineController.simulate()
 
     def simulationCheckCallback(self, sender):
         self.showSimulation = bool(sender.get())
@@ -240,6 +304,36 @@ class CAMSimulatorController(WindowController):
         self.showErrors = bool(sender.get())
         postEvent(f"{DEFAULT_KEY}.errorsVisibilityDidChange")
 
+    def mergeCheckCallback(self, sender):
+        self.mergeCircles = bool(sender.get())
+        postEvent(f"{DEFAULT_KEY}.mergeCirclesDidChange")
+
+    def sweepEditCallback(self, sender):
+        try:
+            sweepSizes = sorted({float(eachSize) for eachSize in sender.get().replace(',', ' ').split()})
+        except ValueError:
+            return
+        if sweepSizes and sweepSizes[0] > 0:
+            self.sweepSizes = sweepSizes
+
+    def lineButtonCallback(self, sender):
+        if self.lineController is None:
+            self.lineController = LineSimulatorController(self)
+        else:
+            self.lineController.w.select()
+
+    def sweepGlyphButtonCallback(self, sender):
+        glyph = CurrentGlyph()
+        self.sweep([glyph] if glyph is not None else [])
+
+    def sweepFontButtonCallback(self, sender):
+        font = CurrentFont()
+        self.sweep(list(font) if font is not None else [])
+
+    def reachCheckCallback(self, sender):
+        self.showReach = bool(sender.get())
+        postEvent(f"{DEFAULT_KEY}.reachVisibilityDidChange")
+
     def previewButtonCallback(self, sender):
         if self.previewOn:
             self.previewOn = False
@@ -260,23 +354,36 @@ class CAMSimulatorSubscriber(Subscriber):
 
         self.backgroundContainer = glyphEditor.extensionContainer(identifier=DEFAULT_KEY, location="background")
         self.backgroundContainer.setVisible(self.controller.previewOn)
-        self.simulationLayer = self.backgroundContainer.appendPathSublayer(
-            fillColor=CIRCLE_COLOR
-        )
+        self.simulationLayer = self.backgroundContainer.appendBaseSublayer()
         self.simulationLayer.setVisible(self.controller.showSimulation)
 
-        self.errorsLayer = self.backgroundContainer.appendPathSublayer(
-            fillColor=ERROR_COLOR
-        )
+        self.errorsLayer = self.backgroundContainer.appendBaseSublayer()
         self.errorsLayer.setVisible(self.controller.showErrors)
+        self.simulationData = None
+
+        self.reachLayer = self.backgroundContainer.appendBaseSublayer()
+        self.reachLayer.setVisible(self.controller.showReach)
+        self.reachData = None
+
+        # simulations run on a worker thread, results are drawn back on the main thread
+        self.scheduler = SimulationScheduler(getSimulation, self.drawSimulation, dispatch=callAfter)
+        self.simulationState = SimulationState()
+        self.reachScheduler = SimulationScheduler(getReachMap, self.drawReach, dispatch=callAfter)
 
     def started(self):
         self.buildVisualization()
 
     def destroy(self):
+        self.scheduler.stop()
+        self.reachScheduler.stop()
         self.backgroundContainer.clearSublayers()
 
     def glyphEditorWillSetGlyph(self, info):
+        self.scheduler.cancel()
+        self.reachScheduler.cancel()
+        self.simulationState = SimulationState()
+        self.simulationData = None
+        self.reachData = None
         self.clearLayers()
 
     glyphEditorDidSetGlyphDelay = 0.25
@@ -301,6 +408,14 @@ class CAMSimulatorSubscriber(Subscriber):
     def errorsVisibilityDidChange(self, info):
         self.errorsLayer.setVisible(self.controller.showErrors)
 
+    def mergeCirclesDidChange(self, info):
+        self.drawLayers()
+
+    def reachVisibilityDidChange(self, info):
+        self.reachLayer.setVisible(self.controller.showReach)
+        if self.controller.showReach and self.controller.previewOn:
+            self.buildVisualization()
+
     def previewDidChange(self, info):
         if self.controller.previewOn:
             self.buildVisualization()
@@ -309,28 +424,141 @@ class CAMSimulatorSubscriber(Subscriber):
     def clearLayers(self):
         self.simulationLayer.clearSublayers()
         self.errorsLayer.clearSublayers()
+        self.reachLayer.clearSublayers()
 
     def buildVisualization(self):
-        self.clearLayers()
-
         glyph = self.getGlyphEditor().getGlyph()
-        data = glyph.getRepresentation(FACTORY_NAME,
+        snapshot = GlyphSnapshot.fromGlyph(glyph)
+        if self.controller.showReach:
+            self.reachScheduler.submit(snapshot,
                                        bodySize=self.controller.bodySize,
                                        bitSize=self.controller.bitSize)
-        bitUPM, simulationCircles, errorCircles = data
+        self.scheduler.submit(snapshot,
+                              bodySize=self.controller.bodySize,
+                              bitSize=self.controller.bitSize,
+                              fieldResolution=self.controller.fieldResolution,
+                              state=self.simulationState,
+                              store=self.controller.store)
+
+    def drawSimulation(self, data):
+        self.simulationData = data
+        self.controller.showStats(self.simulationState.stats)
+        self.drawLayers()
+
+    def drawReach(self, data):
+        self.reachData = data
+        self.drawLayers()
+
+    def drawLayers(self):
+        self.clearLayers()
+        if self.reachData is not None:
+            self.drawReachMap(self.reachLayer, self.reachData)
+        if self.simulationData is None:
+            return
+        simulation = self.simulationData
+
+        if self.controller.mergeCircles:
+            drawCircles = drawToolPath
+        else:
+            drawCircles = drawSymbols
+        drawCircles(self.simulationLayer, simulation, False, CIRCLE_COLOR)
+        drawCircles(self.errorsLayer, simulation, True, ERROR_COLOR)
+
+    def drawReachMap(self, layer, reachMap):
+        # red where the current bit gouges the outline, green where a bit twice as large would still fit
+        bitRadius = reachMap.unitsPerEm * self.controller.bitSize * FROM_MM_TO_PT / self.controller.bodySize / 2
+        dotSize = reachMap.unitsPerEm * REACH_DOT / 1000
+        with layer.sublayerGroup():
+            for eachPt, radius in zip(unpackPoints(reachMap.points), reachMap.radii):
+                step = min(REACH_STEPS, round(radius / bitRadius * REACH_STEPS / 2))
+                imageSettings = dict(name="oval", size=(dotSize, dotSize), fillColor=reachColor(step / REACH_STEPS))
+                layer.appendSymbolSublayer(position=eachPt, imageSettings=imageSettings)
+
+
+class LineSimulatorController(WindowController):
+    """A string of the current font simulated as a single outline, so
+       the material left between kerned neighbours shows up"""
+
+    debug = DEBUG_MODE
+    text = "Hamburg"
 
-        simulationPen = self.simulationLayer.getPen()
-        for eachOval in simulationCircles:
-            x, y = eachOval
-            simulationPen.oval((x, y, bitUPM, bitUPM))
+    def __init__(self, controller):
+        self.controller = controller
+        super().__init__()
 
-        errorsPen = self.errorsLayer.getPen()
-        for eachOval in errorCircles:
-            x, y = eachOval
-            errorsPen.oval((x, y, bitUPM, bitUPM))
+    def build(self):
+        marginLft = 10
+        marginTop = 10
+        EditTextHeight = 22
+        TextBoxHeight = 17
+
+        self.w = Window((800, 300), "CAM Simulator Line", minSize=(300, 150))
+        self.w.textEdit = EditText((marginLft, marginTop, -marginLft, EditTextHeight),
+                                   text=self.text,
+                                   callback=self.textEditCallback)
+        self.w.view = MerzView((0, marginTop*2 + EditTextHeight, -0, -(TextBoxHeight + marginTop)),
+                               backgroundColor=WHITE)
+        self.w.statusCaption = TextBox((marginLft, -(TextBoxHeight + marginTop/2), -marginLft, TextBoxHeight),
+                                       "", sizeStyle="small")
+        self.w.open()
+
+    def started(self):
+        self.scheduler = SimulationScheduler(simulateLine, self.drawLine, dispatch=callAfter)
+        self.simulate()
+
+    def destroy(self):
+        self.scheduler.stop()
+        self.controller.lineController = None
+
+    def simulate(self):
+        font = CurrentFont()
+        if font is None:
+            return
+        # widths and kerning are read here, the outlines travel as snapshots
+        snapshots = {}
+        placements = []
+        for eachGlyph, offset in layoutGlyphs(font, glyphNamesForText(font, self.text)):
+            if eachGlyph.name not in snapshots:
+                snapshots[eachGlyph.name] = GlyphSnapshot.fromGlyph(eachGlyph)
+            placements.append((snapshots[eachGlyph.name], offset))
+        self.w.statusCaption.set("Simulating...")
+        self.scheduler.submit(placements, font.info.unitsPerEm,
+                              bodySize=self.controller.bodySize,
+                              bitSize=self.controller.bitSize)
+
+    def drawLine(self, lineSimulation):
+        container = self.w.view.getMerzContainer()
+        container.clearSublayers()
+        bounds = lineSimulation.outline.bounds
+        if bounds is None:
+            self.w.statusCaption.set("")
+            return
+
+        # the line fits the view, with a bit of margin around the circles
+        margin = lineSimulation.bitUPM
+        xMin, yMin, xMax, yMax = bounds[0]-margin, bounds[1]-margin, bounds[2]+margin, bounds[3]+margin
+        viewWidth, viewHeight = container.getSize()
+        scale = min(viewWidth / (xMax-xMin), viewHeight / (yMax-yMin))
+        lineLayer = container.appendBaseSublayer(position=(-xMin*scale, -yMin*scale))
+        lineLayer.addSublayerScaleTransformation(scale)
+
+        outlineLayer = lineLayer.appendPathSublayer(fillColor=BLACK)
+        lineSimulation.outline.draw(outlineLayer.getPen())
+        for eachSimulation in lineSimulation.simulations:
+            drawToolPath(lineLayer, eachSimulation, False, CIRCLE_COLOR)
+            drawToolPath(lineLayer, eachSimulation, True, ERROR_COLOR)
+
+        errors = ", ".join(f"{glyphName} {eachSimulation.errorCount}"
+                           for (glyphName, _), eachSimulation in zip(lineSimulation.placements, lineSimulation.simulations)
+                           if eachSimulation.errorCount)
+        self.w.statusCaption.set(f"errors: {errors or 'none'}")
+
+    # callbacks
+    def textEditCallback(self, sender):
+        self.text = sender.get()
+        self.simulate()
 
 
 # -- Instructions -- #
 if __name__ == "__main__":
-    registerRepresentationFactory(Glyph, FACTORY_NAME, simulateBorder)
     OpenWindow(CAMSimulatorController)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+# ------------------- #
+# Collision Detection #
+# ------------------- #
+
+# -- Modules -- #
+from math import floor, ceil, sqrt
+from array import array
+from collections import defaultdict
+from fontTools.pens.basePen import BasePen
+
+from geometry import flattenBezierCurve, calcDistance, calcDistanceFromSegment, calcClosestPointOnSegment
+from geometry import loadNumpy, VECTORIZED
+
+
+# -- Constants -- #
+SEGMENT_BYTES = 200    # a segment listed in a cell or a row, with its point tuples, as measured by tracemalloc
+
+
+# -- Objects, Functions, Procedures -- #
+class FlatteningPen(BasePen):
+    """Collects the outline as closed polylines, curves are flattened
+       adaptively within flatness"""
+
+    def __init__(self, flatness):
+        super().__init__({})
+        self.flatness = flatness
+        self.contours = []
+
+    def _moveTo(self, pt):
+        self.contours.append([pt])
+
+    def _lineTo(self, pt):
+        self.contours[-1].append(pt)
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        self.contours[-1].extend(eachPt for eachPt, _ in flattenBezierCurve(self._getCurrentPoint(),
+                                                                             pt1, pt2, pt3,
+                                                                             self.flatness))
+
+    def _closePath(self):
+        contour = self.contours[-1]
+        if contour[-1] != contour[0]:
+            contour.append(contour[0])
+
+    _endPath = _closePath
+
+
+class OutlineIndex:
+    """Flattened outline of a glyph stored in a uniform grid.
+
+       Every segment is registered in the cells it crosses, split in
+       pieces not longer than a cell, and in the horizontal rows it spans,
+       so both proximity and winding queries only visit nearby segments"""
+
+    def __init__(self, contours, cellSize):
+        self.cellSize = cellSize
+        self.cells = defaultdict(list)
+        self.rows = defaultdict(list)
+        self._emptyCellsInside = {}
+        self.pointInsideCalls = 0
+        self.segmentCount = 0
+
+        for eachContour in contours:
+            for pt1, pt2 in zip(eachContour, eachContour[1:]):
+                if pt1 == pt2:
+                    continue
+                for eachRow in range(self._toCell(min(pt1[1], pt2[1])),
+                                     self._toCell(max(pt1[1], pt2[1])) + 1):
+                    self.rows[eachRow].append((pt1, pt2))
+                    self.segmentCount += 1
+
+                pieces = max(1, ceil(calcDistance(pt1, pt2) / cellSize))
+                for eachPiece in range(pieces):
+                    start = self._interpolate(pt1, pt2, eachPiece/pieces)
+                    end = self._interpolate(pt1, pt2, (eachPiece+1)/pieces)
+                    for eachCell in self._cellsInRect(min(start[0], end[0]), min(start[1], end[1]),
+                                                      max(start[0], end[0]), max(start[1], end[1])):
+                        self.cells[eachCell].append((start, end))
+                        self.segmentCount += 1
+
+    @classmethod
+    def fromGlyph(cls, glyph, cellSize, flatness):
+        pen = FlatteningPen(flatness)
+        for eachContour in glyph:
+            eachContour.draw(pen)
+        return cls(pen.contours, cellSize)
+
+    @property
+    def nbytes(self):
+        """An estimate of the memory held by the index"""
+        return self.segmentCount * SEGMENT_BYTES
+
+    def _toCell(self, value):
+        return floor(value / self.cellSize)
+
+    @staticmethod
+    def _interpolate(pt1, pt2, factor):
+        return (pt1[0] + factor*(pt2[0]-pt1[0]), pt1[1] + factor*(pt2[1]-pt1[1]))
+
+    def _cellsInRect(self, xMin, yMin, xMax, yMax):
+        for col in range(self._toCell(xMin), self._toCell(xMax) + 1):
+            for row in range(self._toCell(yMin), self._toCell(yMax) + 1):
+                yield col, row
+
+    def segmentsNear(self, point, distance):
+        x, y = point
+        for eachCell in self._cellsInRect(x-distance, y-distance, x+distance, y+distance):
+            yield from self.cells.get(eachCell, ())
+
+    def isNearOutline(self, point, distance):
+        """True if the outline passes within distance from point"""
+        for pt1, pt2 in self.segmentsNear(point, distance):
+            if calcDistanceFromSegment(point, pt1, pt2) <= distance:
+                return True
+        return False
+
+    def distanceToOutline(self, point, maxDistance):
+        """Distance from point to the closest segment, capped at maxDistance"""
+        distance = maxDistance
+        for pt1, pt2 in self.segmentsNear(point, maxDistance):
+            distance = min(distance, calcDistanceFromSegment(point, pt1, pt2))
+        return distance
+
+    def closestPoint(self, point, maxDistance):
+        """Closest point of the outline and its distance, None if the
+           outline is farther than maxDistance"""
+        closest, distance = None, maxDistance
+        for pt1, pt2 in self.segmentsNear(point, maxDistance):
+            eachPt = calcClosestPointOnSegment(point, pt1, pt2)
+            eachDistance = calcDistance(point, eachPt)
+            if eachDistance <= distance:
+                closest, distance = eachPt, eachDistance
+        if closest is None:
+            return None
+        return closest, distance
+
+    def isEmptyAround(self, point, distance):
+        x, y = point
+        return not any(eachCell in self.cells
+                       for eachCell in self._cellsInRect(x-distance, y-distance, x+distance, y+distance))
+
+    def isEmptyCellInside(self, cell):
+        # no segment crosses the cell, so its centre tells for the whole cell
+        if cell not in self._emptyCellsInside:
+            col, row = cell
+            self._emptyCellsInside[cell] = self.pointInside(((col+.5)*self.cellSize, (row+.5)*self.cellSize))
+        return self._emptyCellsInside[cell]
+
+    def signedDistance(self, point, maxDistance):
+        """Distance to the outline, negative inside and capped at maxDistance"""
+        if self.isEmptyAround(point, maxDistance):
+            distance = maxDistance
+            inside = self.isEmptyCellInside((self._toCell(point[0]), self._toCell(point[1])))
+        else:
+            distance = self.distanceToOutline(point, maxDistance)
+            inside = self.pointInside(point)
+        return -distance if inside else distance
+
+    def discIntersects(self, center, radius):
+        """Exact test between a disc and the filled outline. Discs deep
+           inside or far outside are settled by the cells they cover"""
+        if self.isEmptyAround(center, radius):
+            return self.isEmptyCellInside((self._toCell(center[0]), self._toCell(center[1])))
+        if self.distanceToOutline(center, radius) < radius:
+            return True
+        return self.pointInside(center)
+
+    def pointInside(self, point):
+        """Non-zero winding test, like glyph.pointInside"""
+        self.pointInsideCalls += 1
+        x, y = point
+        winding = 0
+        for (x1, y1), (x2, y2) in self.rows.get(self._toCell(y), ()):
+            if y1 <= y < y2 or y2 <= y < y1:
+                crossing = x1 + (y-y1) * (x2-x1) / (y2-y1)
+                if crossing > x:
+                    winding += 1 if y2 > y1 else -1
+        return winding != 0
+
+
+class DistanceField:
+    """Signed distance from the outline sampled on a regular raster,
+       negative inside the glyph and clamped at maxDistance.
+
+       Queries are a bilinear lookup, which departs from the distance to the
+       flattened outline by less than resolution/sqrt(2), and much less
+       along smooth curves.
+       It answers the same queries as OutlineIndex, so it can replace it:
+       a verdict may differ from the one of the exact index only when the
+       distance from the outline is within errorBound of the threshold.
+
+       The circles of simulateBorder sit a TOLERANCE away from tangency,
+       well within errorBound. Given an exactIndex, the queries that close
+       to the threshold are answered by the index, so the verdicts are the
+       ones of the index, but most circles then fall back on it"""
+
+    def __init__(self, index, bounds, resolution, maxDistance, exactIndex=None, errorBound=None):
+        self.resolution = resolution
+        self.maxDistance = maxDistance
+        self.exactIndex = exactIndex
+        self.errorBound = errorBound if errorBound is not None else resolution/sqrt(2)
+        self._pointInsideCalls = 0
+
+        xMin, yMin, xMax, yMax = bounds
+        self.xOrigin = xMin - maxDistance
+        self.yOrigin = yMin - maxDistance
+        self.cols = ceil((xMax - xMin + 2*maxDistance) / resolution) + 1
+        self.rows = ceil((yMax - yMin + 2*maxDistance) / resolution) + 1
+
+        self.values = array('d')
+        if VECTORIZED:
+            self.values.frombytes(self._calcValuesVectorized(index).tobytes())
+        else:
+            for row in range(self.rows):
+                for col in range(self.cols):
+                    node = (self.xOrigin + col*resolution, self.yOrigin + row*resolution)
+                    self.values.append(index.signedDistance(node, maxDistance))
+
+    def _calcValuesVectorized(self, index):
+        # nodes are processed in blocks sharing a cell of the index, so they share
+        # the same neighbouring segments and the same row of edges for the winding
+        numpy = loadNumpy()
+        xs = self.xOrigin + numpy.arange(self.cols)*self.resolution
+        ys = self.yOrigin + numpy.arange(self.rows)*self.resolution
+        values = numpy.full((self.rows, self.cols), float(self.maxDistance))
+        colCells = numpy.floor(xs / index.cellSize).astype(int)
+        rowCells = numpy.floor(ys / index.cellSize).astype(int)
+
+        for row in numpy.unique(rowCells).tolist():
+            rowSlice = numpy.flatnonzero(rowCells == row)
+            for col in numpy.unique(colCells).tolist():
+                colSlice = numpy.flatnonzero(colCells == col)
+                block = numpy.ix_(rowSlice, colSlice)
+                segments = [eachSegment
+                            for eachCell in index._cellsInRect((col-1)*index.cellSize, (row-1)*index.cellSize,
+                                                               (col+1)*index.cellSize, (row+1)*index.cellSize)
+                            for eachSegment in index.cells.get(eachCell, ())]
+                if not segments:
+                    if index.isEmptyCellInside((col, row)):
+                        values[block] = -self.maxDistance
+                    continue
+
+                nodesX, nodesY = numpy.meshgrid(xs[colSlice], ys[rowSlice])
+                nodesX, nodesY = nodesX.ravel()[:, numpy.newaxis], nodesY.ravel()[:, numpy.newaxis]
+
+                (x1, y1), (x2, y2) = numpy.array(segments).transpose(1, 2, 0)
+                dx, dy = x2-x1, y2-y1
+                factor = numpy.clip(((nodesX-x1)*dx + (nodesY-y1)*dy) / (dx*dx + dy*dy), 0, 1)
+                distance = numpy.hypot(nodesX - (x1 + factor*dx), nodesY - (y1 + factor*dy)).min(axis=1)
+                distance = numpy.minimum(distance, self.maxDistance)
+
+                winding = numpy.zeros(len(distance), dtype=int)
+                edges = index.rows.get(row)
+                if edges:
+                    (x1, y1), (x2, y2) = numpy.array(edges).transpose(1, 2, 0)
+                    crosses = ((y1 <= nodesY) & (nodesY < y2)) | ((y2 <= nodesY) & (nodesY < y1))
+                    with numpy.errstate(divide='ignore', invalid='ignore'):
+                        crossing = x1 + (nodesY-y1) * (x2-x1) / (y2-y1)
+                    winding = (numpy.where(crosses & (crossing > nodesX), 1, 0) * numpy.sign(y2-y1)).sum(axis=1)
+
+                values[block] = numpy.where(winding != 0, -distance, distance).reshape(len(rowSlice), len(colSlice))
+
+        return values
+
+    @classmethod
+    def fromGlyph(cls, glyph, resolution, maxDistance, flatness):
+        index = OutlineIndex.fromGlyph(glyph, cellSize=maxDistance, flatness=flatness)
+        return cls(index, glyph.bounds or (0, 0, 0, 0), resolution, maxDistance)
+
+    @property
+    def nbytes(self):
+        nbytes = len(self.values) * self.values.itemsize
+        if self.exactIndex is not None:
+            nbytes += self.exactIndex.nbytes
+        return nbytes
+
+    def signedDistance(self, point):
+        x = (point[0] - self.xOrigin) / self.resolution
+        y = (point[1] - self.yOrigin) / self.resolution
+        col, row = floor(x), floor(y)
+        if not (0 <= col < self.cols-1 and 0 <= row < self.rows-1):
+            return self.maxDistance
+
+        xFactor, yFactor = x - col, y - row
+        bottom = row*self.cols + col
+        top = bottom + self.cols
+        values = self.values
+        return ((values[bottom]*(1-xFactor) + values[bottom+1]*xFactor)*(1-yFactor) +
+                (values[top]*(1-xFactor) + values[top+1]*xFactor)*yFactor)
+
+    def isNearOutline(self, point, distance):
+        distanceFromOutline = abs(self.signedDistance(point))
+        if self.exactIndex is not None and abs(distanceFromOutline - distance) <= self.errorBound:
+            return self.exactIndex.isNearOutline(point, distance)
+        return distanceFromOutline <= distance
+
+    @property
+    def pointInsideCalls(self):
+        """Winding tests answered by the lookup and by the exact index"""
+        calls = self._pointInsideCalls
+        if self.exactIndex is not None:
+            calls += self.exactIndex.pointInsideCalls
+        return calls
+
+    def pointInside(self, point):
+        signedDistance = self.signedDistance(point)
+        if self.exactIndex is not None and abs(signedDistance) <= self.errorBound:
+            return self.exactIndex.pointInside(point)
+        self._pointInsideCalls += 1
+        return signedDistance < 0
+
+    def discIntersects(self, center, radius):
+        signedDistance = self.signedDistance(center)
+        if self.exactIndex is not None and abs(signedDistance - radius) <= self.errorBound:
+            return self.exactIndex.discIntersects(center, radius)
+        return signedDistance < radius
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# -------------------- #
+# Command Line Helpers #
+# -------------------- #
+
+"""What batch.py, interpolation.py and gcode.py have in common: the
+   glyphs in font order, a pool of processes returning results in the
+   order of the tasks, the output stream and the usual arguments"""
+
+# -- Modules -- #
+import sys
+from contextlib import contextmanager
+from multiprocessing import Pool
+
+from store import defaultStorePath
+
+
+# -- Constants -- #
+ARGUMENTS = {
+    'bodySize': (['--bodySize'], dict(type=float, default=90, help="body size in pt (default: 90)")),
+    'bitSize': (['--bitSize'], dict(type=float, default=1, help="bit diameter in mm (default: 1)")),
+    'fieldResolution': (['--fieldResolution'], dict(type=float, default=None,
+                                                    help="look collisions up in a distance field with this resolution, in upm")),
+    'glyphs': (['--glyphs'], dict(nargs='+', default=None, help="simulate only these glyphs")),
+    'workers': (['--workers'], dict(type=int, default=None, help="number of processes (default: one for each CPU)")),
+    'cache': (['--cache'], dict(nargs='?', const=defaultStorePath(), default=None, metavar='PATH',
+                                help=f"reuse the results saved in a SQLite file (default path: {defaultStorePath()})")),
+    'format': (['--format'], dict(choices=['json', 'csv'], default=None,
+                                  help="report format (default: from the output extension, otherwise json)")),
+    'output': (['-o', '--output'], dict(default=None, help="report path (default: stdout)")),
+}
+
+
+# -- Objects, Functions, Procedures -- #
+def glyphOrder(font):
+    """Names of the glyphs of font in its glyph order, followed by
+       the glyphs missing from the order, sorted"""
+    names = [eachName for eachName in font.glyphOrder if eachName in font]
+    return names + sorted(set(font.keys()) - set(names))
+
+
+_opened = {}
+workerParameters = {}
+
+
+def initWorker(parameters):
+    workerParameters.update(parameters)
+
+
+def openOnce(opener, path):
+    """opener(path), called once in each process for the same path"""
+    if (opener, path) not in _opened:
+        _opened[opener, path] = opener(path)
+    return _opened[opener, path]
+
+
+def _callIndexed(indexedTask):
+    function, indexTask, task = indexedTask
+    return indexTask, function(task)
+
+
+def mapInOrder(function, tasks, parameters, workers=None, chunkSize=1):
+    """function(task) for each task, spread over a pool of processes where
+       workerParameters holds parameters. Results arrive in completion
+       order, they are returned in the order of tasks"""
+    results = [None] * len(tasks)
+    with Pool(workers, initializer=initWorker, initargs=(parameters,)) as pool:
+        indexedTasks = [(function, indexTask, eachTask) for indexTask, eachTask in enumerate(tasks)]
+        for indexTask, result in pool.imap_unordered(_callIndexed, indexedTasks, chunksize=chunkSize):
+            results[indexTask] = result
+    return results
+
+
+def addArguments(parser, *names):
+    """Adds the arguments of ARGUMENTS called names to parser"""
+    for eachName in names:
+        flags, options = ARGUMENTS[eachName]
+        parser.add_argument(*flags, **options)
+
+
+def outputFormat(args):
+    """The --format of args, otherwise found from the --output extension"""
+    if args.format is not None:
+        return args.format
+    return 'csv' if args.output and args.output.lower().endswith('.csv') else 'json'
+
+
+@contextmanager
+def openOutput(path, newline=None):
+    """The file at path, stdout without a path"""
+    if not path:
+        yield sys.stdout
+        return
+    with open(path, 'w', newline=newline) as stream:
+        yield stream
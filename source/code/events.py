@@ -4,10 +4,6 @@
 # Events #
 # ------ #
 
-# -- Modules -- #
-from mojo.subscriber import registerSubscriberEvent, getRegisteredSubscriberEvents
-
-
 # -- Constants -- #
 DEBUG_MODE = True
 DEFAULT_KEY = 'it.robertoArista.CAMSimulator'
@@ -15,11 +11,16 @@ DEFAULT_KEY = 'it.robertoArista.CAMSimulator'
 
 # -- Instructions -- #
 if __name__ == '__main__':
+    # the constants above are shared with the headless modules, RoboFont is only needed here
+    from mojo.subscriber import registerSubscriberEvent, getRegisteredSubscriberEvents
+
     events = [
         ('bodySizeDidChange', 0.25),
         ('bitSizeDidChange', 0.25),
         ('simulationVisibilityDidChange', 0),
         ('errorsVisibilityDidChange', 0),
+        ('mergeCirclesDidChange', 0),
+        ('reachVisibilityDidChange', 0),
         ('previewDidChange', 0.25),
     ]
 
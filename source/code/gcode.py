@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+# ------------- #
+# G-code Export #
+# ------------- #
+
+"""Writes the tool path of the simulation as G-code, without RoboFont.
+
+   python3 gcode.py Regular.ufo --text "Hamburg" --bodySize 90 --bitSize 1 -o hamburg.nc
+
+   The tool follows the centres of the circles that do not touch the
+   outline, contour by contour, and turns around convex corners on arcs
+   so it never comes closer to the outline than the circles. Glyphs are simulated one at a time and
+   their moves are written as soon as they are ready, so a whole alphabet
+   at poster size never sits in memory at once"""
+
+# -- Modules -- #
+import sys
+import argparse
+from math import sqrt
+
+from defcon import Font
+
+from commandLine import glyphOrder, addArguments, openOutput
+from geometry import calcDistance
+from simulation import FROM_MM_TO_PT, TOLERANCE, glyphContourKeys, flattenedIndex, getSimulation, SimulationState, iterSimulation, iterSimulationRuns
+from textLine import glyphNamesForText, layoutGlyphs
+from cache import SimulationCache
+from store import SimulationStore
+
+
+# -- Constants -- #
+UNITS = {
+    # code, factor from mm, decimals
+    'mm': ('G21', 1, 3),
+    'in': ('G20', 1/25.4, 4),
+}
+ARC_SAGITTA = TOLERANCE/2    # upm, straight moves bulging less than this towards the outline are kept
+MAX_SPLITS = 8    # halvings of a straight move pushed away from the outline
+
+
+# -- Objects, Functions, Procedures -- #
+def calcSagitta(pt1, pt2, radius):
+    halfChord = min(calcDistance(pt1, pt2)/2, radius)
+    return radius - sqrt(radius*radius - halfChord*halfChord)
+
+
+def iterMoves(pt1, pivot1, pt2, pivot2, index, offset, depth=0):
+    # a move whose middle comes closer to the outline than the circles is
+    # split there, the middle pushed back offset away from the outline.
+    # Halves turning around the same point of the outline, a corner, are arcs
+    if pivot1 is not None and pivot1 == pivot2:
+        yield pt2, pivot1 if calcSagitta(pt1, pt2, offset) > ARC_SAGITTA else None
+        return
+    middle = (pt1[0]+pt2[0])/2, (pt1[1]+pt2[1])/2
+    closest = index.closestPoint(middle, offset)
+    if depth < MAX_SPLITS and closest is not None and 0 < closest[1] < offset - ARC_SAGITTA:
+        pivot, distance = closest
+        factor = offset / distance
+        pushed = pivot[0] + (middle[0]-pivot[0])*factor, pivot[1] + (middle[1]-pivot[1])*factor
+        yield from iterMoves(pt1, pivot1, pushed, pivot, index, offset, depth+1)
+        yield from iterMoves(pushed, pivot, pt2, pivot2, index, offset, depth+1)
+        return
+    yield pt2, None
+
+
+def iterToolMoves(centers, index, offset):
+    """Moves from the first centre of a run through the others, as (point,
+       pivot) pairs: an arc around pivot, or a straight move when pivot is
+       None. Where the outline turns away from the tool the circles spread
+       apart and a straight move between them would cut the corner, so the
+       tool goes around the point of the outline the circles touch"""
+    pivots = []
+    for eachCenter in centers:
+        closest = index.closestPoint(eachCenter, 2*offset)
+        pivots.append(None if closest is None else closest[0])
+    for indexCenter in range(1, len(centers)):
+        yield from iterMoves(centers[indexCenter-1], pivots[indexCenter-1],
+                             centers[indexCenter], pivots[indexCenter], index, offset)
+
+
+def iterGCode(placements, bodySize=90, bitSize=1, fieldResolution=None, feed=600, plungeFeed=200,
+              depth=1, safeZ=5, units='mm', cache=None, store=None):
+    """G-code lines, without line breaks, for placements of (glyph, (x, y))
+       in font units. Feeds are in units per minute, depth and safeZ in
+       units, all in the units chosen. Placements are consumed lazily, each
+       glyph is simulated when its first move is due.
+
+       Without a store the circles stream from iterSimulation, one contour
+       in memory at a time. With a SimulationStore, results go through cache
+       and the store like in getSimulation. The tool turns around the
+       convex corners on arcs a bit radius plus TOLERANCE away from them,
+       like the circles, see iterToolMoves"""
+    code, factor, decimals = UNITS[units]
+
+    def coordinates(**values):
+        return ' '.join(f"{axis}{value:.{decimals}f}" for axis, value in values.items())
+
+    def move(start, end, pivot):
+        x, y = end
+        if pivot is None:
+            return f"G1 {coordinates(X=x, Y=y)}"
+        # clockwise when the turn from start to end around pivot is negative
+        cross = (start[0]-pivot[0])*(end[1]-pivot[1]) - (start[1]-pivot[1])*(end[0]-pivot[0])
+        arc = 'G2' if cross < 0 else 'G3'
+        return f"{arc} {coordinates(X=x, Y=y, I=pivot[0]-start[0], J=pivot[1]-start[1])}"
+
+    yield f"(CAM Simulator, {bitSize} mm bit at {bodySize} pt)"
+    yield f"{code} G90 G17"
+    yield f"G0 {coordinates(Z=safeZ)}"
+
+    for glyph, (dx, dy) in placements:
+        if store is None:
+            runs = iterSimulationRuns(iterSimulation(glyph, bodySize, bitSize, fieldResolution))
+        else:
+            simulation = getSimulation(glyph, bodySize, bitSize, fieldResolution, state=SimulationState(),
+                                       cache=cache, store=store)
+            runs = simulation.iterRuns(touching=False)
+        unitsPerEm = glyph.font.info.unitsPerEm
+        bitUPM = unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize
+        index = flattenedIndex(glyphContourKeys(glyph), bitUPM)
+        scale = bodySize / (unitsPerEm * FROM_MM_TO_PT) * factor
+
+        def place(point):
+            return (point[0]+dx)*scale, (point[1]+dy)*scale
+
+        yield f"(glyph {glyph.name})"
+        for eachRun, closed in runs:
+            if closed:
+                eachRun = eachRun + eachRun[:1]
+            x, y = previousPt = place(eachRun[0])
+            yield f"G0 {coordinates(X=x, Y=y)}"
+            yield f"G1 {coordinates(Z=-depth)} F{plungeFeed:g}"
+            for indexMove, (eachPt, pivot) in enumerate(iterToolMoves(eachRun, index, bitUPM/2 + TOLERANCE)):
+                eachPt = place(eachPt)
+                line = move(previousPt, eachPt, None if pivot is None else place(pivot))
+                yield f"{line} F{feed:g}" if indexMove == 0 else line
+                previousPt = eachPt
+            yield f"G0 {coordinates(Z=safeZ)}"
+
+    yield "M2"
+
+
+def writeGCode(lines, stream):
+    for eachLine in lines:
+        stream.write(eachLine)
+        stream.write('\n')
+
+
+def parseArguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Export the simulated tool path of a text or of a whole UFO as G-code")
+    parser.add_argument('font', help="UFO path")
+    parser.add_argument('--text', default=None, help="text to set, lines split on new lines (default: every glyph)")
+    addArguments(parser, 'bodySize', 'bitSize', 'fieldResolution')
+    parser.add_argument('--units', choices=sorted(UNITS), default='mm', help="program units (default: mm)")
+    parser.add_argument('--feed', type=float, default=600, help="cutting feed, in units per minute (default: 600)")
+    parser.add_argument('--plungeFeed', type=float, default=200,
+                        help="plunge feed, in units per minute (default: 200)")
+    parser.add_argument('--depth', type=float, default=1, help="cutting depth, in units (default: 1)")
+    parser.add_argument('--safeZ', type=float, default=5, help="travel height, in units (default: 5)")
+    addArguments(parser, 'cache')
+    parser.add_argument('-o', '--output', default=None, help="G-code path (default: stdout)")
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parseArguments(arguments)
+    font = Font(args.font)
+    if args.text is None:
+        lines = [glyphOrder(font)]
+    else:
+        lines = glyphNamesForText(font, args.text)
+
+    store = SimulationStore(args.cache) if args.cache else None
+    gcodeLines = iterGCode(layoutGlyphs(font, lines), args.bodySize, args.bitSize, args.fieldResolution,
+                           feed=args.feed, plungeFeed=args.plungeFeed, depth=args.depth, safeZ=args.safeZ,
+                           units=args.units, cache=SimulationCache(maxBytes=0), store=store)
+
+    try:
+        with openOutput(args.output) as stream:
+            writeGCode(gcodeLines, stream)
+    finally:
+        if store is not None:
+            store.close()
+    return 0
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,11 +5,32 @@
 # ---------------- #
 
 # -- Modules -- #
-from math import sqrt, cos, radians, sin, atan2
+from math import sqrt, cos, radians, sin, atan2, ceil
+from bisect import bisect_left
+from itertools import accumulate, chain
+from array import array
+from functools import lru_cache
+from importlib.util import find_spec
 from fontTools.misc.bezierTools import calcCubicParameters
 
 
+# -- Constants -- #
+VECTORIZED = find_spec('numpy') is not None
+MAX_PIECE_LENGTH = 6   # upm, t drifts from arc length along longer flattened pieces
+
+
 # -- Objects, Functions, Procedures -- #
+@lru_cache(maxsize=1)
+def loadNumpy():
+    """numpy is imported on first use, it takes longer to import
+       than the whole simulation and not every run needs it"""
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    return numpy
+
+
 def calcPointOnBezier(a, b, c, d, tValue):
     ax, ay = a
     bx, by = b
@@ -43,15 +64,68 @@ def collectPointsOnLine(pt1, pt2, distance):
     return points
 
 
+def packPoints(points):
+    """(x, y) pairs stored one after the other in a flat array of doubles"""
+    return array('d', chain.from_iterable(points))
+
+
+def unpackPoints(values):
+    return list(zip(values[0::2], values[1::2]))
+
+
 def interpolate(poleOne, poleTwo, factor):
     desiredValue = poleOne + factor*(poleTwo-poleOne)
     return desiredValue
 
 
-def collectPointsOnBezierCurve(pt1, pt2, pt3, pt4, steps):
+@lru_cache(maxsize=8)
+def calcPowersOfT(steps):
+    """t, t**2 and t**3 for the steps used by collectPointsOnBezierCurve.
+       Powers are taken with the builtin operator, numpy.power rounds
+       differently on some platforms and would move the points"""
+    numpy = loadNumpy()
+    tValues = [t/float(steps) for t in range(steps-2)]
+    return numpy.array([[t**3 for t in tValues],
+                        [t**2 for t in tValues],
+                        tValues])
+
+
+def calcPointsOnBeziers(parameters, steps):
+    """Evaluate several cubics at once. parameters is a sequence of
+       (a, b, c, d) tuples as returned by calcCubicParameters, the result
+       holds one row of x and one row of y values for each cubic"""
+    numpy = loadNumpy()
+    coefficients = numpy.asarray(parameters, dtype=float)
+    tCubed, tSquared, tValues = calcPowersOfT(steps)
+    a, b, c, d = (coefficients[:, index, :, numpy.newaxis] for index in range(4))
+    return a*tCubed + b*tSquared + c*tValues + d
+
+
+def collectPointsOnBezierCurves(curves, steps):
+    """Vectorized collectPointsOnBezierCurve over a sequence of
+       (pt1, pt2, pt3, pt4) cubics, for example all the curves of a contour"""
+    if not curves:
+        return []
+    parameters = [calcCubicParameters(*eachCurve) for eachCurve in curves]
+    coordinates = calcPointsOnBeziers(parameters, steps)
+    tValues = calcPowersOfT(steps)[2].tolist()
+
+    collected = []
+    for (pt1, _, _, pt4), (xs, ys) in zip(curves, coordinates.tolist()):
+        pointsWithT = [(pt1, 0)]
+        pointsWithT.extend(zip(zip(xs, ys), tValues))
+        pointsWithT.append((pt4, 1))
+        collected.append(pointsWithT)
+    return collected
+
+
+def collectPointsOnBezierCurve(pt1, pt2, pt3, pt4, steps, vectorized=VECTORIZED):
     """Adapted from calcCubicBounds in fontTools
        by Just van Rossum https://github.com/behdad/fonttools"""
 
+    if vectorized:
+        return collectPointsOnBezierCurves([(pt1, pt2, pt3, pt4)], steps)[0]
+
     a, b, c, d = calcCubicParameters(pt1, pt2, pt3, pt4)
     steps = [t/float(steps) for t in range(steps-2)]
 
@@ -64,32 +138,169 @@ def collectPointsOnBezierCurve(pt1, pt2, pt3, pt4, steps):
     return pointsWithT
 
 
-def collectPointsOnBezierCurveWithFixedDistance(pt1, pt2, pt3, pt4, distance):
-    tStep = 1000
-    rawPoints = collectPointsOnBezierCurve(pt1, pt2, pt3, pt4, tStep)
-
-    index = 0
-    cleanPoints = []
-    while index < len(rawPoints):
-        eachPt, tStep = rawPoints[index]
-        cleanPoints.append(eachPt)
-        for progress in range(1, len(rawPoints) - index):
-            if calcDistance(eachPt, rawPoints[index + progress][0]) >= distance:
-                index = index + progress
-                break
+def calcCumulativeLengths(points):
+    return list(accumulate((calcDistance(pt1, pt2) for pt1, pt2 in zip(points, points[1:])),
+                           initial=0))
+
+
+def calcEvenStep(length, distance):
+    """The largest step not longer than distance which divides length
+       evenly, so the last chord of a segment is as long as the others"""
+    if length == 0:
+        return distance
+    return length / ceil(length / distance)
+
+
+def resamplePolyline(points, distance, tValues=None, parameters=None):
+    """Points evenly spaced by at most distance along the arc length of a polyline.
+       The chord length table is built once, then each new point is found
+       with a bisection starting from the previous one. When the polyline
+       flattens a cubic, its tValues and parameters place the new points
+       back on the curve instead of on the chords"""
+    lengths = calcCumulativeLengths(points)
+    step = calcEvenStep(lengths[-1], distance)
+
+    cleanPoints = [points[0]]
+    index = 1
+    target = step
+    while target < lengths[-1] - step/2:
+        index = bisect_left(lengths, target, index)
+        factor = (target - lengths[index-1]) / (lengths[index] - lengths[index-1])
+        if tValues is None:
+            x = interpolate(points[index-1][0], points[index][0], factor)
+            y = interpolate(points[index-1][1], points[index][1], factor)
         else:
-            break
+            x, y = calcPointOnBezier(*parameters, interpolate(tValues[index-1], tValues[index], factor))
+        cleanPoints.append((x, y))
+        target += step
+
+    if cleanPoints[-1] != points[-1]:
+        cleanPoints.append(points[-1])
+
+    return cleanPoints
+
+
+def resamplePolylineVectorized(xs, ys, distance):
+    """Array version of resamplePolyline, all the points are
+       placed at once by interpolating on the chord length table"""
+    numpy = loadNumpy()
+    lengths = numpy.zeros(len(xs))
+    numpy.cumsum(numpy.hypot(numpy.diff(xs), numpy.diff(ys)), out=lengths[1:])
+    step = calcEvenStep(lengths[-1], distance)
+    targets = numpy.arange(1, round(lengths[-1]/step)) * step
 
-    if rawPoints[-1] not in cleanPoints:
-        cleanPoints.append(rawPoints[-1][0])
+    cleanPoints = [(float(xs[0]), float(ys[0]))]
+    cleanPoints.extend(zip(numpy.interp(targets, lengths, xs).tolist(),
+                           numpy.interp(targets, lengths, ys).tolist()))
+    lastPt = (float(xs[-1]), float(ys[-1]))
+    if cleanPoints[-1] != lastPt:
+        cleanPoints.append(lastPt)
 
     return cleanPoints
 
 
-def isTouching(offsetPoint, radius, glyph, angleStep=15):
+def midPoint(pt1, pt2):
+    return (pt1[0] + pt2[0])*.5, (pt1[1] + pt2[1])*.5
+
+
+def splitBezierCurve(pt1, pt2, pt3, pt4):
+    """de Casteljau split at t=.5"""
+    pt12 = midPoint(pt1, pt2)
+    pt23 = midPoint(pt2, pt3)
+    pt34 = midPoint(pt3, pt4)
+    pt123 = midPoint(pt12, pt23)
+    pt234 = midPoint(pt23, pt34)
+    middle = midPoint(pt123, pt234)
+    return (pt1, pt12, pt123, middle), (middle, pt234, pt34, pt4)
+
+
+def calcDistanceFromLine(point, pt1, pt2):
+    chord = calcDistance(pt1, pt2)
+    if chord == 0:
+        return calcDistance(point, pt1)
+    return abs((pt2[0]-pt1[0])*(pt1[1]-point[1]) - (pt1[0]-point[0])*(pt2[1]-pt1[1])) / chord
+
+
+def calcClosestPointOnSegment(point, pt1, pt2):
+    dx, dy = pt2[0]-pt1[0], pt2[1]-pt1[1]
+    lengthSquared = dx*dx + dy*dy
+    if lengthSquared == 0:
+        return pt1
+    factor = min(1, max(0, ((point[0]-pt1[0])*dx + (point[1]-pt1[1])*dy) / lengthSquared))
+    return pt1[0] + factor*dx, pt1[1] + factor*dy
+
+
+def calcDistanceFromSegment(point, pt1, pt2):
+    return calcDistance(point, calcClosestPointOnSegment(point, pt1, pt2))
+
+
+def isFlat(pt1, pt2, pt3, pt4, flatness):
+    # the curve never departs from its chord more than 3/4 of the control points distance
+    return max(calcDistanceFromLine(pt2, pt1, pt4),
+               calcDistanceFromLine(pt3, pt1, pt4)) * .75 <= flatness
+
+
+def flattenBezierCurve(pt1, pt2, pt3, pt4, flatness, tStart=0, tEnd=1, maxDepth=16, maxLength=None):
+    """Polyline approximation of a cubic as (point, t) pairs, recursively
+       split until every piece stays within flatness from its chord, and
+       is not longer than maxLength if given.
+       The first point is not included, so consecutive curves can be chained"""
+    if maxDepth == 0 or (isFlat(pt1, pt2, pt3, pt4, flatness) and
+                         (maxLength is None or calcDistance(pt1, pt4) <= maxLength)):
+        return [(pt4, tEnd)]
+    head, tail = splitBezierCurve(pt1, pt2, pt3, pt4)
+    tMiddle = (tStart + tEnd)*.5
+    return (flattenBezierCurve(*head, flatness, tStart, tMiddle, maxDepth-1, maxLength) +
+            flattenBezierCurve(*tail, flatness, tMiddle, tEnd, maxDepth-1, maxLength))
+
+
+def collectPointsOnBezierCurveWithFixedDistance(pt1, pt2, pt3, pt4, distance, flatness=None, vectorized=VECTORIZED,
+                                                flattened=None):
+    """If flatness is given the curve is flattened adaptively, in pieces
+       not longer than distance nor MAX_PIECE_LENGTH, otherwise it is sampled
+       on a fixed number of t-values. A flattened curve, as returned by
+       flattenBezierCurve with the same flatness and length, is not flattened again"""
+    if flatness is not None:
+        if flattened is None:
+            flattened = flattenBezierCurve(pt1, pt2, pt3, pt4, flatness, maxLength=min(distance, MAX_PIECE_LENGTH))
+        pointsWithT = [(pt1, 0)] + flattened
+        polyline, tValues = zip(*pointsWithT)
+        return resamplePolyline(polyline, distance, tValues,
+                                calcCubicParameters(pt1, pt2, pt3, pt4))
+
+    tStep = 1000
+    if vectorized:
+        numpy = loadNumpy()
+        (xs, ys), = calcPointsOnBeziers([calcCubicParameters(pt1, pt2, pt3, pt4)], tStep)
+        xs = numpy.concatenate(([pt1[0]], xs, [pt4[0]]))
+        ys = numpy.concatenate(([pt1[1]], ys, [pt4[1]]))
+        return resamplePolylineVectorized(xs, ys, distance)
+
+    rawPoints = collectPointsOnBezierCurve(pt1, pt2, pt3, pt4, tStep, vectorized=False)
+    return resamplePolyline([eachPt for eachPt, _ in rawPoints], distance)
+
+
+def isTouching(offsetPoint, radius, glyph, angleStep=15, index=None, exact=False):
+    """Probes the circle perimeter with glyph.pointInside. With a collision
+       index (see collision.OutlineIndex) a circle far from the outline is
+       settled with a single winding test and the probes only visit the
+       segments near each of them. The exact mode compares the distance
+       from the centre to the flattened outline with the radius instead
+       of probing, so no hairline can slip between two probes"""
+    if exact:
+        if index is None:
+            raise ValueError("exact collisions are found by the index, none was given")
+        return index.discIntersects(offsetPoint, radius)
+
+    pointInside = glyph.pointInside
+    if index is not None:
+        if not index.isNearOutline(offsetPoint, radius):
+            return index.pointInside(offsetPoint)
+        pointInside = index.pointInside
+
     for angle in range(0, 360, angleStep):
         x = offsetPoint[0] + cos(radians(angle))*radius
         y = offsetPoint[1] + sin(radians(angle))*radius
-        if glyph.pointInside((x, y)):
+        if pointInside((x, y)):
             return True
     return False
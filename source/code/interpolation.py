@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+# ------------------- #
+# Interpolation Sweep #
+# ------------------- #
+
+"""Simulates the instances of a designspace without RoboFont.
+
+   python3 interpolation.py Family.designspace --steps 5 --bodySize 90 --bitSize 1 -o report.json
+
+   Each axis is stepped from its minimum to its maximum, with the other
+   axes at their default, and every glyph is simulated at every step. The
+   report gives the errors at each step and the ranges of each axis where
+   errors appear, for each glyph and for the whole family.
+
+   The masters of a glyph are flattened once, on t-values shared by all
+   of them, so an instance interpolates its flattened curves and outline
+   instead of flattening them again. Glyphs are spread over a pool of
+   processes, each process opens the sources once"""
+
+# -- Modules -- #
+import sys
+import csv
+import json
+import argparse
+from array import array
+from fontTools.designspaceLib import DesignSpaceDocument
+from fontTools.varLib.models import VariationModel
+from fontTools.misc.bezierTools import calcCubicParameters
+
+from defcon import Font
+
+from geometry import calcPointOnBezier, flattenBezierCurve, packPoints, unpackPoints, MAX_PIECE_LENGTH
+from collision import OutlineIndex
+from snapshot import GlyphSnapshot
+from commandLine import glyphOrder, workerParameters, openOnce, mapInOrder, addArguments, outputFormat, openOutput
+from simulation import FROM_MM_TO_PT, TOLERANCE, ContourResult, SimulationResult, glyphContourKeys, iterVerdicts
+
+
+# -- Constants -- #
+CHUNK_SIZE = 4
+STEPS = 5
+CSV_FIELDS = ['glyph', 'axis', 'value', 'circles', 'errors']
+
+SAMPLING_FLATNESS = TOLERANCE/2    # as ContourBreakingPen
+OUTLINE_FLATNESS = TOLERANCE/10    # as ContourResult
+
+
+# -- Objects, Functions, Procedures -- #
+def contourStructure(recording):
+    return tuple((operator, len(points)) for operator, points in recording)
+
+
+def iterCurves(recording):
+    """(segment index, pt1, pt2, pt3, pt4) for each cubic of a contour recording"""
+    for indexSegment, (operator, points) in enumerate(recording):
+        if operator == 'moveTo':
+            currentPt = points[0]
+        elif operator == 'curveTo':
+            yield (indexSegment, currentPt, *points)
+        if points:
+            currentPt = points[-1]
+
+
+def mergedTValues(curves, flatness, maxLength=None):
+    """t-values splitting every curve within flatness: splits of the
+       flattening of one curve refine the flattening of the others"""
+    return sorted({t for eachCurve in curves for _, t in flattenBezierCurve(*eachCurve, flatness, maxLength=maxLength)})
+
+
+def pointsAtTValues(curve, tValues):
+    parameters = calcCubicParameters(*curve)
+    return [curve[3] if t == 1 else calcPointOnBezier(*parameters, t) for t in tValues]
+
+
+class GlyphMasters:
+    """Decomposed outlines of a glyph in the sources that have it. Each
+       master is laid out as a flat array of its points, followed by the
+       flattenings of its curves for the sampling and by its polylines
+       for the collisions, all on t-values shared by the masters: an
+       instance is the sum of the masters weighted by the model scalars"""
+
+    def __init__(self, name, recordings, locations):
+        self.name = name
+        self.model = VariationModel(locations)
+        self.structure = [contourStructure(eachRecording) for eachRecording in recordings[0]]
+
+        masterCurves = [{(indexContour, indexSegment): curve
+                         for indexContour, eachRecording in enumerate(eachMaster)
+                         for indexSegment, *curve in iterCurves(eachRecording)}
+                        for eachMaster in recordings]
+        self.sampleTValues = {}
+        self.outlineTValues = {}
+        for eachKey in masterCurves[0]:
+            curves = [eachCurves[eachKey] for eachCurves in masterCurves]
+            self.sampleTValues[eachKey] = mergedTValues(curves, SAMPLING_FLATNESS, MAX_PIECE_LENGTH)
+            self.outlineTValues[eachKey] = mergedTValues(curves, OUTLINE_FLATNESS)
+
+        self.masterValues = [self._layOut(eachMaster) for eachMaster in recordings]
+        # the polylines of the masters have the same number of points
+        self.outlineCounts = [len(list(self._iterOutline(indexContour, eachRecording)))
+                              for indexContour, eachRecording in enumerate(recordings[0])]
+
+    @classmethod
+    def fromGlyphs(cls, glyphs, locations):
+        """None if the decomposed outlines do not interpolate"""
+        recordings = [glyphContourKeys(eachGlyph) for eachGlyph in glyphs]
+        structure = [contourStructure(eachRecording) for eachRecording in recordings[0]]
+        for eachMaster in recordings[1:]:
+            if [contourStructure(eachRecording) for eachRecording in eachMaster] != structure:
+                return None
+        return cls(glyphs[0].name, recordings, locations)
+
+    def _iterOutline(self, indexContour, recording):
+        # the polyline of FlatteningPen, closed after the interpolation
+        curves = {indexSegment: curve for indexSegment, *curve in iterCurves(recording)}
+        for indexSegment, (operator, points) in enumerate(recording):
+            if operator in ('moveTo', 'lineTo'):
+                yield points[0]
+            elif operator == 'curveTo':
+                yield from pointsAtTValues(curves[indexSegment], self.outlineTValues[indexContour, indexSegment])
+
+    def _layOut(self, recordings):
+        values = array('d')
+        for eachRecording in recordings:
+            for _, points in eachRecording:
+                values.extend(packPoints(points))
+        for indexContour, eachRecording in enumerate(recordings):
+            for indexSegment, *curve in iterCurves(eachRecording):
+                values.extend(packPoints(pointsAtTValues(curve, self.sampleTValues[indexContour, indexSegment])))
+        for indexContour, eachRecording in enumerate(recordings):
+            values.extend(packPoints(self._iterOutline(indexContour, eachRecording)))
+        return values
+
+    def instance(self, location):
+        """Contour recordings, flattenings as used by ContourBreakingPen and
+           the polyline of each contour, at a normalized location"""
+        values = None
+        for scalar, eachMaster in zip(self.model.getMasterScalars(location), self.masterValues):
+            if not scalar:
+                continue
+            if values is None:
+                values = [scalar*value for value in eachMaster]
+            else:
+                values = [value + scalar*masterValue for value, masterValue in zip(values, eachMaster)]
+        points = iter(unpackPoints(values))
+
+        recordings = []
+        for eachStructure in self.structure:
+            recordings.append(tuple((operator, tuple(next(points) for _ in range(count)))
+                                    for operator, count in eachStructure))
+
+        flattenings = {}
+        for indexContour, eachRecording in enumerate(recordings):
+            for indexSegment, *curve in iterCurves(eachRecording):
+                tValues = self.sampleTValues[indexContour, indexSegment]
+                flattenings[tuple(curve)] = [(next(points), t) for t in tValues]
+
+        polylines = []
+        for eachCount in self.outlineCounts:
+            polyline = [next(points) for _ in range(eachCount)]
+            if polyline[-1] != polyline[0]:
+                polyline.append(polyline[0])
+            polylines.append(polyline)
+        return recordings, flattenings, polylines
+
+
+def simulateInstance(masters, location, unitsPerEm, bodySize=90, bitSize=1):
+    """SimulationResult of the glyph at a normalized location, checked
+       against its interpolated outline"""
+    bitUPM = unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize
+    recordings, flattenings, polylines = masters.instance(location)
+    glyph = GlyphSnapshot(recordings, unitsPerEm, name=masters.name)
+    index = OutlineIndex(polylines, cellSize=bitUPM)
+
+    simulation = SimulationResult(bitUPM)
+    for key, eachPolyline in zip(recordings, polylines):
+        result = ContourResult(key, bitUPM, polylines=[packPoints(eachPolyline)], flattenings=flattenings)
+        simulation.contourStarts.append(len(simulation))
+        simulation.centers.extend(result.offsetPoints)
+        simulation.touching.extend(touching for _, touching in iterVerdicts(unpackPoints(result.offsetPoints),
+                                                                            bitUPM/2, glyph, index))
+    return simulation
+
+
+class Designspace:
+    """Sources of a designspace opened with defcon, with their normalized
+       locations. Only continuous axes are stepped"""
+
+    def __init__(self, path):
+        self.path = path
+        self.document = DesignSpaceDocument.fromfile(path)
+        self.axes = [eachAxis for eachAxis in self.document.axes if not hasattr(eachAxis, 'values')]
+        self.layers = []
+        self.locations = []
+        fonts = {}
+        for eachSource in self.document.sources:
+            if eachSource.path not in fonts:
+                fonts[eachSource.path] = Font(eachSource.path)
+            font = fonts[eachSource.path]
+            self.layers.append(font.layers[eachSource.layerName] if eachSource.layerName else font.layers.defaultLayer)
+            self.locations.append(self.document.normalizeLocation(eachSource.location))
+        self.defaultFont = fonts[self.document.findDefault().path]
+
+    @property
+    def unitsPerEm(self):
+        return self.defaultFont.info.unitsPerEm
+
+    def axisSteps(self, steps=STEPS):
+        """{axis name: [(user value, normalized location), ...]} from the
+           minimum to the maximum of each axis, the others at their default"""
+        default = {eachAxis.name: eachAxis.map_forward(eachAxis.default) for eachAxis in self.axes}
+        axisSteps = {}
+        for eachAxis in self.axes:
+            axisSteps[eachAxis.name] = []
+            for indexStep in range(steps):
+                value = eachAxis.minimum + (eachAxis.maximum - eachAxis.minimum) * indexStep / max(steps-1, 1)
+                location = dict(default, **{eachAxis.name: eachAxis.map_forward(value)})
+                axisSteps[eachAxis.name].append((value, self.document.normalizeLocation(location)))
+        return axisSteps
+
+    def masters(self, glyphName):
+        """GlyphMasters of the sources with the glyph, None if it does not interpolate"""
+        sources = [(eachLayer[glyphName], eachLocation)
+                   for eachLayer, eachLocation in zip(self.layers, self.locations)
+                   if glyphName in eachLayer]
+        if not any(not any(eachLocation.values()) for _, eachLocation in sources):
+            # the default master is missing
+            return None
+        glyphs, locations = zip(*sources)
+        return GlyphMasters.fromGlyphs(glyphs, locations)
+
+
+def errorRanges(values, errorCounts):
+    """[first, last] value of each run of steps with errors"""
+    ranges = []
+    previousCount = 0
+    for value, count in zip(values, errorCounts):
+        if count:
+            if previousCount:
+                ranges[-1][1] = value
+            else:
+                ranges.append([value, value])
+        previousCount = count
+    return ranges
+
+
+def sweepInstances(designspace, glyphName, axisSteps, bodySize=90, bitSize=1):
+    """{axis name: {'values': [...], 'circles': [...], 'errors': [...], 'errorRanges': [[first, last], ...]}},
+       or {'interpolable': False}. The default location is simulated once for all the axes"""
+    masters = designspace.masters(glyphName)
+    if masters is None:
+        return {'interpolable': False}
+    simulations = {}
+    glyphReport = {}
+    for axisName, steps in axisSteps.items():
+        circles, errors = [], []
+        for _, location in steps:
+            locationKey = tuple(sorted(location.items()))
+            if locationKey not in simulations:
+                simulations[locationKey] = simulateInstance(masters, location, designspace.unitsPerEm, bodySize, bitSize)
+            circles.append(len(simulations[locationKey]))
+            errors.append(simulations[locationKey].errorCount)
+        values = [value for value, _ in steps]
+        glyphReport[axisName] = {'values': values, 'circles': circles, 'errors': errors,
+                                 'errorRanges': errorRanges(values, errors)}
+    return glyphReport
+
+
+def sweepGlyph(glyphName):
+    designspace = openOnce(Designspace, workerParameters['path'])
+    return sweepInstances(designspace, glyphName, workerParameters['axisSteps'],
+                          workerParameters['bodySize'], workerParameters['bitSize'])
+
+
+def sweepDesignspace(path, steps=STEPS, bodySize=90, bitSize=1, glyphNames=None, workers=None):
+    """Returns {'axes': {axis name: {'values': [...], 'errors': [...], 'errorRanges': [...]}},
+       'glyphs': {glyphName: report of sweepInstances}}. The errors of an axis
+       are summed over the glyphs, so its ranges cover the whole family"""
+    designspace = openOnce(Designspace, path)
+    axisSteps = designspace.axisSteps(steps)
+    names = [eachName for eachName in glyphOrder(designspace.defaultFont) if not glyphNames or eachName in glyphNames]
+
+    parameters = dict(path=path, axisSteps=axisSteps, bodySize=bodySize, bitSize=bitSize)
+    glyphs = dict(zip(names, mapInOrder(sweepGlyph, names, parameters, workers, CHUNK_SIZE)))
+    axes = {}
+    for axisName, axisStepsList in axisSteps.items():
+        values = [value for value, _ in axisStepsList]
+        errors = [sum(eachGlyph[axisName]['errors'][indexStep] for eachGlyph in glyphs.values() if axisName in eachGlyph)
+                  for indexStep in range(len(values))]
+        axes[axisName] = {'values': values, 'errors': errors, 'errorRanges': errorRanges(values, errors)}
+    return {'axes': axes, 'glyphs': glyphs}
+
+
+def writeJSON(report, stream, path, bodySize, bitSize):
+    json.dump({'designspace': path, 'bodySize': bodySize, 'bitSize': bitSize, **report}, stream, indent=2)
+    stream.write('\n')
+
+
+def writeCSV(report, stream):
+    # one row for each glyph and step, glyphs that do not interpolate get a single row
+    writer = csv.writer(stream)
+    writer.writerow(CSV_FIELDS)
+    for glyphName, glyphReport in report['glyphs'].items():
+        if glyphReport.get('interpolable') is False:
+            writer.writerow([glyphName, '', '', '', ''])
+            continue
+        for axisName, axisReport in glyphReport.items():
+            for value, circles, errors in zip(axisReport['values'], axisReport['circles'], axisReport['errors']):
+                writer.writerow([glyphName, axisName, round(value, 3), circles, errors])
+
+
+def parseArguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Simulate the milling of every glyph along the axes of a designspace")
+    parser.add_argument('designspace', help="designspace path")
+    parser.add_argument('--steps', type=int, default=STEPS,
+                        help=f"instances along each axis, from its minimum to its maximum (default: {STEPS})")
+    addArguments(parser, 'bodySize', 'bitSize', 'glyphs', 'workers', 'format', 'output')
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parseArguments(arguments)
+    report = sweepDesignspace(args.designspace, args.steps, args.bodySize, args.bitSize,
+                              glyphNames=set(args.glyphs) if args.glyphs else None, workers=args.workers)
+
+    with openOutput(args.output, newline='') as stream:
+        if outputFormat(args) == 'csv':
+            writeCSV(report, stream)
+        else:
+            writeJSON(report, stream, args.designspace, args.bodySize, args.bitSize)
+
+    errors = sum(sum(eachAxis['errors']) for eachAxis in report['axes'].values())
+    return 1 if errors else 0
+
+
+# -- Instructions -- #
+if __name__ == '__main__':
+    sys.exit(main())
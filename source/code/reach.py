@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# ---------------- #
+# Reachable Radius #
+# ---------------- #
+
+# -- Modules -- #
+from math import radians, cos, sin
+from array import array
+from functools import partial
+from fontTools.pens.recordingPen import replayRecording
+
+from events import DEFAULT_KEY
+from geometry import unpackPoints
+from collision import FlatteningPen, OutlineIndex
+from scheduler import SimulationCancelled
+from simulation import FROM_MM_TO_PT, TOLERANCE, ContourBreakingPen, iterSampleAngles
+from simulation import glyphContourKeys, outlineKey, neverCancelled
+from cache import simulationCache
+
+
+# -- Constants -- #
+MAX_BIT_SIZE = 10   # mm, larger radii are reported as this bit
+MAX_ITERATIONS = 32
+
+
+# -- Objects, Functions, Procedures -- #
+def calcReachableRadius(point, normal, index, maxRadius):
+    """Radius of the largest disc placed like the circles of simulateBorder,
+       a TOLERANCE away from point on the side of normal, a unit vector,
+       that does not cross the outline: the distance from there to the
+       medial axis of the background.
+
+       The disc shrinks until no point of the outline is closer to its
+       centre than its radius. Each step moves to the disc through the
+       closest point found, which is never smaller than the answer"""
+    start = point[0] + normal[0]*TOLERANCE, point[1] + normal[1]*TOLERANCE
+    radius = maxRadius
+    for _ in range(MAX_ITERATIONS):
+        center = start[0] + normal[0]*radius, start[1] + normal[1]*radius
+        closest = index.closestPoint(center, radius - TOLERANCE/10)
+        if closest is None:
+            break
+        closestPt, _ = closest
+        dx, dy = closestPt[0]-start[0], closestPt[1]-start[1]
+        towards = dx*normal[0] + dy*normal[1]
+        if towards <= 0:
+            return 0.
+        radius = (dx*dx + dy*dy) / (2*towards)
+        if radius < TOLERANCE/10:
+            return 0.
+    return radius
+
+
+class ReachMap:
+    """Largest tool radius, in units, that fits at each sample of the
+       outline without gouging it. Samples are the points where
+       simulateBorder places its circles with the same bit, and a circle
+       touches the outline where the radius is smaller than the bit's.
+       Points are packed, see packPoints"""
+
+    __slots__ = ('unitsPerEm', 'points', 'radii', 'contourStarts')
+
+    def __init__(self, unitsPerEm):
+        self.unitsPerEm = unitsPerEm
+        self.points = array('d')
+        self.radii = array('d')
+        self.contourStarts = array('L')
+
+    def __len__(self):
+        return len(self.radii)
+
+    @property
+    def nbytes(self):
+        return sum(eachArray.itemsize * len(eachArray)
+                   for eachArray in (self.points, self.radii, self.contourStarts))
+
+    def toBitSize(self, radius, bodySize=90):
+        """Bit diameter in mm of a radius in units"""
+        return 2*radius * bodySize / (self.unitsPerEm * FROM_MM_TO_PT)
+
+    def iterBitSizes(self, bodySize=90):
+        """(x, y) and the largest bit diameter in mm for each sample"""
+        for eachPt, radius in zip(unpackPoints(self.points), self.radii):
+            yield eachPt, self.toBitSize(radius, bodySize)
+
+
+def calcReachMap(glyph, bodySize=90, bitSize=1, maxBitSize=MAX_BIT_SIZE, isCancelled=None):
+    """The ReachMap of the glyph at the samples of a bitSize simulation.
+       One computation answers for every bit up to maxBitSize, instead of
+       a simulation for each"""
+    if isCancelled is None:
+        isCancelled = neverCancelled
+    unitsPerEm = glyph.font.info.unitsPerEm
+    bitUPM = unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize
+    maxRadius = unitsPerEm * maxBitSize * FROM_MM_TO_PT / bodySize / 2
+
+    keys = glyphContourKeys(glyph)
+    flatteningPen = FlatteningPen(flatness=TOLERANCE/10)
+    for key in keys:
+        replayRecording(key, flatteningPen)
+    # queries reach up to twice maxRadius away from the samples
+    index = OutlineIndex(flatteningPen.contours, cellSize=maxRadius/4)
+
+    reachMap = ReachMap(unitsPerEm)
+    for key in keys:
+        if isCancelled():
+            raise SimulationCancelled
+        reachMap.contourStarts.append(len(reachMap))
+        for eachPt, angle in iterSampleAngles(ContourBreakingPen(bitUPM).iterSamples(key)):
+            normal = cos(angle+radians(-90)), sin(angle+radians(-90))
+            reachMap.points.extend(eachPt)
+            reachMap.radii.append(calcReachableRadius(eachPt, normal, index, maxRadius))
+    return reachMap
+
+
+REACH_FACTORY_NAME = f"{DEFAULT_KEY}.reachMap"
+def getReachMap(glyph, bodySize=90, bitSize=1, maxBitSize=MAX_BIT_SIZE, isCancelled=None, cache=None):
+    if cache is None:
+        cache = simulationCache
+    key = (REACH_FACTORY_NAME, outlineKey(glyph), bodySize, bitSize, maxBitSize)
+    return cache.get(key, partial(calcReachMap, glyph, bodySize, bitSize, maxBitSize, isCancelled))
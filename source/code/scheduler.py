@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# -------------------- #
+# Simulation Scheduler #
+# -------------------- #
+
+# -- Modules -- #
+import threading
+import traceback
+from functools import partial
+
+
+# -- Objects, Functions, Procedures -- #
+class SimulationCancelled(Exception):
+    pass
+
+
+def runNow(callback):
+    callback()
+
+
+class SimulationScheduler:
+    """Runs compute on a worker thread, one job at a time.
+
+       Every submit supersedes the job waiting or running: the running one
+       is told through the isCancelled callable it receives and its result,
+       if any, is dropped. Results are handed to deliver through dispatch
+       (in RoboFont, a call on the main thread) and delivered only if no
+       newer job was submitted meanwhile, so a stale result is never drawn"""
+
+    def __init__(self, compute, deliver, dispatch=runNow):
+        self.compute = compute
+        self.deliver = deliver
+        self.dispatch = dispatch
+
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._pending = None
+        self._busy = False
+        self._stopped = False
+
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+
+    def submit(self, *args, **kwargs):
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, args, kwargs)
+            self._condition.notify_all()
+            return self._generation
+
+    def cancel(self):
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+            self._condition.notify_all()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+        self.cancel()
+
+    def isCurrent(self, generation):
+        return generation == self._generation
+
+    def waitUntilIdle(self, timeout=None):
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or self._stopped)
+                if self._stopped:
+                    return
+                generation, args, kwargs = self._pending
+                self._pending = None
+                self._busy = True
+
+            try:
+                result = self.compute(*args, isCancelled=partial(self._isStale, generation), **kwargs)
+            except SimulationCancelled:
+                pass
+            except Exception:
+                traceback.print_exc()
+            else:
+                if self.isCurrent(generation):
+                    self.dispatch(partial(self._deliver, generation, result))
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _isStale(self, generation):
+        return not self.isCurrent(generation)
+
+    def _deliver(self, generation, result):
+        if self.isCurrent(generation):
+            self.deliver(result)
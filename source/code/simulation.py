@@ -0,0 +1,739 @@
+#!/usr/bin/env python3
+
+# ---------- #
+# Simulation #
+# ---------- #
+
+# -- Modules -- #
+from math import radians, ceil, sqrt, isclose
+from array import array
+from time import perf_counter
+from collections import Counter, deque
+from itertools import islice, groupby
+from operator import itemgetter
+from contextlib import contextmanager, nullcontext
+from copy import copy
+from functools import partial
+from fontTools.pens.basePen import BasePen
+from fontTools.pens.recordingPen import RecordingPen, replayRecording
+from fontTools.pens.boundsPen import BoundsPen
+from fontTools.misc.transform import Transform
+
+from events import DEFAULT_KEY
+from geometry import collectPointsOnLine, collectPointsOnBezierCurveWithFixedDistance, flattenBezierCurve
+from geometry import projectPoint, isTouching, calcAngle, packPoints, unpackPoints, MAX_PIECE_LENGTH
+from collision import FlatteningPen, OutlineIndex, DistanceField
+from scheduler import SimulationCancelled
+from snapshot import isFlipped, transformingPen
+from cache import simulationCache
+
+
+# -- Constants -- #
+FROM_MM_TO_PT = 2.834627813
+
+TOLERANCE = .1   # upm
+DISTANCE = .2    # percentage of bit radius
+DISTANCE_THRESHOLD = 6
+ADAPTIVE_FLATTENING = True
+EXACT_COLLISION = True
+EXACT_FIELD = False   # opt-in: the distance field settles the circles near tangency with the exact index, see DistanceField
+PROFILING = False   # opt-in: times every call and shows the stats in the controller
+ALGORITHM_VERSION = 4    # bump when circles move or change verdict, stored results are dropped
+
+UNKNOWN = -1     # verdict of a circle not checked yet
+MAX_COMPONENT_DEPTH = 16
+
+
+# -- Objects, Functions, Procedures -- #
+class ContourBreakingPen(BasePen):
+    """Samples along the outline, spaced by a fraction of the bit.
+       Drawn into, it collects the samples of the last contour in points,
+       iterSamples streams them from a contour recording instead.
+       flattenings maps curves to their flattened polylines, which do not
+       depend on the bit: a dict shared by several pens flattens each curve once"""
+
+    def __init__(self, bitUPM, flattenings=None):
+        super().__init__({})
+        self.flattenings = flattenings
+        if DISTANCE*bitUPM > DISTANCE_THRESHOLD:
+            self.relativeDistance = int(DISTANCE*bitUPM)
+        else:
+            self.relativeDistance = DISTANCE_THRESHOLD
+
+        # samples are placed back on the curve, the flattening only shortens
+        # the arc length, by less than half the flatness for each radian of turn
+        if ADAPTIVE_FLATTENING:
+            self.flatness = TOLERANCE/2
+        else:
+            self.flatness = None
+
+    def _sampleLine(self, pt1, pt2):
+        return collectPointsOnLine(pt1, pt2, self.relativeDistance)
+
+    def _sampleCurve(self, pt1, pt2, pt3, pt4):
+        flattened = None
+        if self.flatness is not None:
+            curve = (pt1, pt2, pt3, pt4)
+            if self.flattenings is None:
+                flattened = flattenBezierCurve(*curve, self.flatness, maxLength=MAX_PIECE_LENGTH)
+            else:
+                if curve not in self.flattenings:
+                    self.flattenings[curve] = flattenBezierCurve(*curve, self.flatness, maxLength=MAX_PIECE_LENGTH)
+                flattened = self.flattenings[curve]
+        return collectPointsOnBezierCurveWithFixedDistance(pt1, pt2, pt3, pt4,
+                                                           self.relativeDistance,
+                                                           flatness=self.flatness,
+                                                           flattened=flattened)
+
+    def iterSamples(self, recording):
+        """Samples of a contour recording, segment after segment. Only the
+           samples of the current segment are held in memory"""
+        for operator, points in recording:
+            if operator == 'moveTo':
+                firstPt = prevPt = points[0]
+            elif operator == 'lineTo':
+                yield from self._sampleLine(prevPt, points[0])
+                prevPt = points[0]
+            elif operator == 'curveTo':
+                yield from self._sampleCurve(prevPt, *points)
+                prevPt = points[-1]
+            elif operator == 'closePath':
+                yield from self._sampleLine(prevPt, firstPt)
+            elif operator != 'endPath':
+                # keys are recorded with cubics only, see contourKey
+                raise ValueError(f"cannot sample {operator} segments")
+
+    # BasePen splits quadratics and long curves into cubics for these
+    def _moveTo(self, pt):
+        self.points = []
+        self._firstPt = pt
+        self._prevPt = pt
+
+    def _lineTo(self, pt):
+        self.points.extend(self._sampleLine(self._prevPt, pt))
+        self._prevPt = pt
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        self.points.extend(self._sampleCurve(self._prevPt, pt1, pt2, pt3))
+        self._prevPt = pt3
+
+    def _closePath(self):
+        self.points.extend(self._sampleLine(self._prevPt, self._firstPt))
+        self._prevPt = None
+
+
+class SimulationStats:
+    """Wall time of each phase and sample counts of a simulateBorder
+       call. Times are in seconds, pointInsideCalls counts the winding
+       tests made by the index, including the ones of the exact mode and
+       of the exact index behind a distance field"""
+
+    phases = ('flattening', 'sampling', 'offsets', 'diff', 'index', 'collisions', 'total')
+    countNames = ('contours', 'sampledContours', 'samples', 'circles',
+                  'checkedCircles', 'pointInsideCalls', 'errors')
+
+    def __init__(self, glyphName=None):
+        self.glyphName = glyphName
+        self.times = dict.fromkeys(self.phases, 0.)
+        self.counts = dict.fromkeys(self.countNames, 0)
+
+    @contextmanager
+    def timing(self, phase):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.times[phase] += perf_counter() - start
+
+    def asDict(self):
+        return {'glyph': self.glyphName, 'times': dict(self.times), 'counts': dict(self.counts)}
+
+    def __str__(self):
+        lines = [f"{eachPhase}: {self.times[eachPhase]*1000:.1f} ms" for eachPhase in self.phases]
+        lines += [f"{eachName}: {self.counts[eachName]}" for eachName in self.countNames]
+        return '\n'.join(lines)
+
+
+def timing(stats, phase):
+    if stats is None:
+        return nullcontext()
+    return stats.timing(phase)
+
+
+DISTANCE_FIELD_FACTORY_NAME = f"{DEFAULT_KEY}.distanceField"
+def distanceFieldFactory(glyph, resolution=1, maxDistance=100):
+    # a flatness below the lookup error would only add segments. The verdicts
+    # agree with the exact mode but within errorBound of tangency, with
+    # EXACT_FIELD the queries there go to the outline flattened as in simulateBorder
+    keys = glyphContourKeys(glyph)
+    flatteningPen = FlatteningPen(flatness=resolution/4)
+    boundsPen = BoundsPen(glyphSet=None)
+    for key in keys:
+        replayRecording(key, flatteningPen)
+        replayRecording(key, boundsPen)
+    index = OutlineIndex(flatteningPen.contours, cellSize=maxDistance)
+    exactIndex = flattenedIndex(keys, maxDistance) if EXACT_FIELD else None
+    errorBound = resolution/sqrt(2) + resolution/4 + TOLERANCE/10
+    return DistanceField(index, boundsPen.bounds or (0, 0, 0, 0), resolution, maxDistance,
+                         exactIndex=exactIndex, errorBound=errorBound)
+
+
+def getDistanceField(glyph, resolution=1, maxDistance=100, outline=None, cache=None):
+    """The distance field of the glyph, from the cache when an equal
+       outline was already rasterized with the same settings"""
+    if cache is None:
+        cache = simulationCache
+    if outline is None:
+        outline = outlineKey(glyph)
+    return cache.get((DISTANCE_FIELD_FACTORY_NAME, outline, resolution, maxDistance, EXACT_FIELD),
+                     partial(distanceFieldFactory, glyph, resolution, maxDistance))
+
+
+class CubicRecordingPen(BasePen):
+    """RecordingPen that keeps only cubics: quadratics, as drawn by
+       TrueType-flavoured UFOs, and curves with several off-curve points
+       are split by BasePen and recorded as the cubics they are"""
+
+    def __init__(self):
+        super().__init__(None)
+        self.value = []
+
+    def _moveTo(self, pt):
+        self.value.append(('moveTo', (pt,)))
+
+    def _lineTo(self, pt):
+        self.value.append(('lineTo', (pt,)))
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        self.value.append(('curveTo', (pt1, pt2, pt3)))
+
+    def _closePath(self):
+        self.value.append(('closePath', ()))
+
+    def _endPath(self):
+        self.value.append(('endPath', ()))
+
+
+def contourKey(contour):
+    recorder = CubicRecordingPen()
+    contour.draw(recorder)
+    return tuple(recorder.value)
+
+
+def transformRecording(recording, transformation):
+    recorder = RecordingPen()
+    replayRecording(recording, transformingPen(recorder, transformation))
+    return tuple(recorder.value)
+
+
+def isIsometry(transformation):
+    """True if the transformation keeps distances: moves, rotations and mirrors"""
+    xx, xy, yx, yy = transformation[:4]
+    return isclose(xx*xx + xy*xy, 1) and isclose(yx*yx + yy*yy, 1) and isclose(xx*yx + xy*yy, 0, abs_tol=1e-9)
+
+
+def iterContourSources(glyph, depth=0):
+    """(key, base key, transformation) for each contour of the glyph, then
+       for each contour of its components, decomposed at any depth. Contours
+       of the glyph itself are their own base, with no transformation"""
+    for eachContour in glyph:
+        key = contourKey(eachContour)
+        yield key, key, None
+    if depth == MAX_COMPONENT_DEPTH:
+        return
+    for eachComponent in getattr(glyph, 'components', ()):
+        if eachComponent.baseGlyph not in glyph.layer:
+            continue
+        baseGlyph = glyph.layer[eachComponent.baseGlyph]
+        if baseGlyph is None:
+            continue
+        transformation = Transform(*eachComponent.transformation)
+        for _, baseKey, baseTransformation in iterContourSources(baseGlyph, depth+1):
+            if baseTransformation is not None:
+                composed = transformation.transform(baseTransformation)
+            else:
+                composed = transformation
+            yield transformRecording(baseKey, composed), baseKey, composed
+
+
+def flattenedIndex(keys, cellSize):
+    """OutlineIndex of contour keys flattened like in ContourResult"""
+    flatteningPen = FlatteningPen(flatness=TOLERANCE/10)
+    for key in keys:
+        replayRecording(key, flatteningPen)
+    return OutlineIndex(flatteningPen.contours, cellSize=cellSize)
+
+
+def glyphContourKeys(glyph):
+    """Keys of the contours of the glyph and of its decomposed components"""
+    return [key for key, _, _ in iterContourSources(glyph)]
+
+
+def outlineKey(glyph):
+    return glyph.font.info.unitsPerEm, tuple(glyphContourKeys(glyph))
+
+
+def contourSegments(key):
+    """The segments of a recorded contour, each with its starting point"""
+    segments = []
+    for operator, points in key:
+        if operator == 'moveTo':
+            startPt = currentPt = points[0]
+        elif operator == 'closePath':
+            if currentPt != startPt:
+                segments.append((currentPt, 'lineTo', (startPt,)))
+        elif operator != 'endPath':
+            segments.append((currentPt, operator, points))
+            currentPt = points[-1]
+    return segments
+
+
+def segmentPoints(segment):
+    startPt, _, points = segment
+    return (startPt, ) + points
+
+
+def boundsOverlap(bounds, other):
+    return (bounds[0] <= other[2] and other[0] <= bounds[2] and
+            bounds[1] <= other[3] and other[1] <= bounds[3])
+
+
+def iterSampleAngles(points):
+    """(sample, tangent angle) of the samples of a closed contour that get
+       a circle, the repeated ones are skipped. The first sample needs the
+       last one as its neighbour, so it comes out last.
+       points can be any iterable, only five samples are held at a time"""
+    # the chord between the neighbouring samples follows the tangent,
+    # the incoming chord alone would tilt the circles towards convex curves.
+    # Contours are closed, so the last sample sees the first ones as neighbours
+    head = []
+    def lookAhead():
+        for eachPt in points:
+            if len(head) < 3:
+                head.append(eachPt)
+            yield eachPt, False
+        for indexPt, eachPt in enumerate(head):
+            # the first sample gets its circle after the last one
+            yield eachPt, indexPt > 0
+
+    def angleAtSecond(window):
+        (previousPt, _), (eachPt, wrapped) = window[0], window[1]
+        if not wrapped and eachPt != previousPt:
+            nextPt = next((pt for pt, _ in islice(window, 2, None) if pt != eachPt), eachPt)
+            return eachPt, calcAngle(previousPt, nextPt)
+
+    # the previous sample, the current one and the next three
+    window = deque()
+    for eachItem in lookAhead():
+        window.append(eachItem)
+        if len(window) == 5:
+            sampleAngle = angleAtSecond(window)
+            if sampleAngle is not None:
+                yield sampleAngle
+            window.popleft()
+    # short contours never fill the window
+    while len(window) >= 2:
+        sampleAngle = angleAtSecond(window)
+        if sampleAngle is not None:
+            yield sampleAngle
+        window.popleft()
+
+
+def iterOffsets(samples, bitUPM):
+    """Centres of the circles along samples of a closed contour, a bit
+       radius plus TOLERANCE away from the outline"""
+    for eachPt, angle in iterSampleAngles(samples):
+        yield projectPoint(point=eachPt, angle=angle+radians(-90), distance=bitUPM/2 + TOLERANCE)
+
+
+def iterVerdicts(centers, radius, glyph, index):
+    """(centre, touching) for each centre"""
+    for eachCenter in centers:
+        yield eachCenter, isTouching(eachCenter, radius, glyph, index=index, exact=EXACT_COLLISION)
+
+
+class ContourResult:
+    """Tool positions and verdicts of a single contour, reused by
+       simulateBorder as long as the contour and its neighbours do not change.
+       Points are packed, see packPoints, and verdicts are UNKNOWN, 0 or 1.
+
+       The polylines and the flattenings of the curves do not depend on the
+       bit, a sweep over several bits passes them from the first result.
+       The result of a base glyph contour is moved onto the components
+       that use it, see transformed"""
+
+    def __init__(self, key, bitUPM, stats=None, polylines=None, flattenings=None):
+        self.key = key
+
+        if polylines is None:
+            with timing(stats, 'flattening'):
+                flatteningPen = FlatteningPen(flatness=TOLERANCE/10)
+                replayRecording(key, flatteningPen)
+                polylines = [packPoints(eachPolyline) for eachPolyline in flatteningPen.contours]
+        self.polylines = polylines
+        self._setBounds(bitUPM)
+        self.offsetPoints = self._placeCircles(bitUPM, stats, flattenings)
+        self.verdicts = None
+
+    def _setBounds(self, bitUPM):
+        xs = [x for eachPolyline in self.polylines for x in eachPolyline[0::2]]
+        ys = [y for eachPolyline in self.polylines for y in eachPolyline[1::2]]
+        self.bounds = (min(xs), min(ys), max(xs), max(ys))
+
+        # circles reach one bit diameter from the outline
+        reach = bitUPM + TOLERANCE
+        self.reach = (self.bounds[0]-reach, self.bounds[1]-reach,
+                      self.bounds[2]+reach, self.bounds[3]+reach)
+
+    @property
+    def nbytes(self):
+        return sum(eachArray.itemsize * len(eachArray) for eachArray in self.polylines + [self.offsetPoints])
+
+    def copy(self):
+        result = copy(self)
+        result.verdicts = array('b', self.verdicts)
+        return result
+
+    def transformed(self, key, transformation, bitUPM):
+        """The result moved by an isometry, for the contour key of a component.
+           Spacing and offsets are kept by moves, rotations and mirrors, so
+           the circles are the base circles moved, in reverse order if mirrored"""
+        result = copy(self)
+        result.key = key
+        polylines = [transformation.transformPoints(unpackPoints(eachPolyline)) for eachPolyline in self.polylines]
+        centers = transformation.transformPoints(unpackPoints(self.offsetPoints))
+        if isFlipped(transformation):
+            # the winding tests of the index depend on the direction
+            polylines = [eachPolyline[::-1] for eachPolyline in polylines]
+            centers.reverse()
+        result.polylines = [packPoints(eachPolyline) for eachPolyline in polylines]
+        result.offsetPoints = packPoints(centers)
+        result._setBounds(bitUPM)
+        result.verdicts = None
+        return result
+
+    def _placeCircles(self, bitUPM, stats=None, flattenings=None):
+        # samples stream into the packed centres, unless profiling
+        # asks for the time spent on each stage
+        samples = ContourBreakingPen(bitUPM, flattenings).iterSamples(self.key)
+        if stats is not None:
+            with timing(stats, 'sampling'):
+                samples = list(samples)
+            stats.counts['samples'] += len(samples)
+
+        with timing(stats, 'offsets'):
+            return packPoints(iterOffsets(samples, bitUPM))
+
+
+CONTOUR_FACTORY_NAME = f"{DEFAULT_KEY}.contourResult"
+def makeContourResult(key, baseKey, transformation, bitUPM, stats=None, cache=None, polylines=None, flattenings=None):
+    """ContourResult of a contour from iterContourSources. Components moved,
+       rotated or mirrored reuse the result of their base contour, kept in
+       the cache and shared by all the glyphs. Scaled ones are sampled again.
+       polylines and flattenings are passed to ContourResult, see sweepBitSizes"""
+    if transformation is None or not isIsometry(transformation):
+        return ContourResult(key, bitUPM, stats, polylines=polylines, flattenings=flattenings)
+    if cache is None:
+        cache = simulationCache
+    baseResult = cache.get((CONTOUR_FACTORY_NAME, baseKey, bitUPM, ADAPTIVE_FLATTENING),
+                           partial(ContourResult, baseKey, bitUPM, stats, flattenings=flattenings))
+    return baseResult.transformed(key, transformation, bitUPM)
+
+
+class SimulationResult:
+    """Circles found by simulateBorder, packed in arrays: centers holds
+       the x, y of each circle one after the other, touching is 1 for the
+       circles touching the outline, and contourStarts the index of the
+       first circle of each contour.
+
+       It still unpacks as (bitUPM, simulationCircles, errorCircles),
+       with the circles as lists of their lower left corners"""
+
+    __slots__ = ('bitUPM', 'centers', 'touching', 'contourStarts')
+
+    def __init__(self, bitUPM):
+        self.bitUPM = bitUPM
+        self.centers = array('d')
+        self.touching = array('b')
+        self.contourStarts = array('L')
+
+    def __len__(self):
+        return len(self.touching)
+
+    @property
+    def nbytes(self):
+        return sum(len(eachArray) * eachArray.itemsize
+                   for eachArray in (self.centers, self.touching, self.contourStarts))
+
+    def __iter__(self):
+        radius = self.bitUPM/2
+        yield self.bitUPM
+        yield [(x-radius, y-radius) for x, y in self.iterCenters(touching=False)]
+        yield [(x-radius, y-radius) for x, y in self.iterCenters(touching=True)]
+
+    @property
+    def errorCount(self):
+        return sum(self.touching)
+
+    def iterCenters(self, touching=None):
+        """Centres of all the circles, or only of the ones
+           touching or not touching the outline"""
+        centers = self.centers
+        for index, flag in enumerate(self.touching):
+            if touching is None or flag == touching:
+                yield centers[2*index], centers[2*index+1]
+
+    def iterRuns(self, touching=False):
+        """Consecutive circles of a contour with the same flag, as
+           (centres, closed) pairs. A closed run goes all around its contour"""
+        centers = self.centers
+        ends = list(self.contourStarts[1:]) + [len(self)]
+        for start, end in zip(self.contourStarts, ends):
+            yield from iterContourRuns([((centers[2*index], centers[2*index+1]), self.touching[index])
+                                        for index in range(start, end)], touching)
+
+
+def iterContourRuns(circles, touching=False):
+    """Runs of a contour given as a list of (centre, flag), see iterRuns"""
+    runs = []
+    previousFlag = None
+    for eachCenter, flag in circles:
+        if flag == touching:
+            if previousFlag != touching:
+                runs.append([])
+            runs[-1].append(eachCenter)
+        previousFlag = flag
+
+    if len(runs) == 1 and len(runs[0]) == len(circles):
+        yield runs[0], len(runs[0]) > 2
+        return
+    # contours are closed, the run ending the contour goes on with the first one
+    if len(runs) > 1 and circles[0][1] == touching and circles[-1][1] == touching:
+        runs[0] = runs.pop() + runs[0]
+    for eachRun in runs:
+        yield eachRun, False
+
+
+def iterSimulationRuns(circles, touching=False):
+    """iterRuns of the stream of iterSimulation, one contour in memory at a time"""
+    for _, contourCircles in groupby(circles, key=itemgetter(0)):
+        yield from iterContourRuns([(eachCenter, flag) for _, eachCenter, flag in contourCircles], touching)
+
+
+class SimulationState:
+    """The contours of the last simulateBorder run on a glyph"""
+
+    def __init__(self):
+        self.parameters = None
+        self.results = {}
+        self.stats = None
+
+
+def neverCancelled():
+    return False
+
+
+def findCirclesToCheck(results, newResults, removedResults, bitUPM):
+    """The circles of results whose verdict is unknown or may have changed,
+       as (result, circle indexes) pairs. Reused results to be checked are
+       replaced in results by a copy"""
+    # the edit is made of the segments found only in the removed or only in the new contours
+    newSegments = Counter(eachSegment for eachResult in newResults for eachSegment in contourSegments(eachResult.key))
+    removedSegments = Counter(eachSegment for eachResult in removedResults for eachSegment in contourSegments(eachResult.key))
+    editedPoints = [eachPt
+                    for eachSegment in (newSegments - removedSegments) + (removedSegments - newSegments)
+                    for eachPt in segmentPoints(eachSegment)]
+
+    # only the circles whose discs meet the edit, grown by a bit diameter, can change verdict
+    radius = bitUPM/2
+    dirtyRegion = None
+    if editedPoints:
+        xs, ys = zip(*editedPoints)
+        dirtyRegion = (min(xs)-bitUPM, min(ys)-bitUPM, max(xs)+bitUPM, max(ys)+bitUPM)
+
+    # unchanged segments of edited contours give back the same circles
+    previousVerdicts = {eachPt: touching
+                        for eachResult in removedResults
+                        for eachPt, touching in zip(unpackPoints(eachResult.offsetPoints), eachResult.verdicts)}
+
+    toCheck = []
+    for indexResult, eachResult in enumerate(results):
+        if eachResult.verdicts is None:
+            eachResult.verdicts = array('b', (previousVerdicts.get(eachPt, UNKNOWN)
+                                              for eachPt in unpackPoints(eachResult.offsetPoints)))
+        elif dirtyRegion is None or not boundsOverlap(eachResult.reach, dirtyRegion):
+            continue
+        else:
+            # results of the previous state must stay valid if this run is cancelled
+            eachResult = results[indexResult] = eachResult.copy()
+        dirtyCircles = [indexPt for indexPt, (x, y) in enumerate(unpackPoints(eachResult.offsetPoints))
+                        if eachResult.verdicts[indexPt] == UNKNOWN or
+                        boundsOverlap((x-radius, y-radius, x+radius, y+radius), dirtyRegion)]
+        if dirtyCircles:
+            toCheck.append((eachResult, dirtyCircles))
+
+    return toCheck
+
+
+FACTORY_NAME = f"{DEFAULT_KEY}.simulateBorder"
+def simulateBorder(glyph, bodySize=90, bitSize=1, fieldResolution=None, state=None, isCancelled=None, stats=None):
+    """Returns a SimulationResult. With a fieldResolution the collisions are
+       looked up in a signed distance field of the glyph, kept in simulationCache:
+       a circle closer to tangency than resolution/sqrt(2) + resolution/4 + TOLERANCE/10
+       may get another verdict than in the exact mode, unless EXACT_FIELD is set.
+
+       Contours are cached between calls on the same glyph, keyed by their
+       point data: only new contours are sampled again, and only the circles
+       close to the edited segments are checked again. The cache lives in
+       state, kept by the caller: without one every contour is sampled.
+
+       isCancelled is polled between contours, when it returns True the
+       simulation raises SimulationCancelled and leaves state untouched.
+
+       With PROFILING on, or if a SimulationStats is given, the timings
+       and counts of the call are collected and kept as state.stats"""
+    startTime = perf_counter()
+    assert bodySize > 0 or bodySize is not None
+    assert bitSize > 0 or bitSize is not None
+    bitUPM = glyph.font.info.unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize
+
+    if isCancelled is None:
+        isCancelled = neverCancelled
+    if state is None:
+        state = SimulationState()
+    if stats is None and PROFILING:
+        stats = SimulationStats(glyphName=getattr(glyph, 'name', None))
+
+    parameters = (bitUPM, fieldResolution, ADAPTIVE_FLATTENING, EXACT_COLLISION, EXACT_FIELD)
+    available = {}
+    if state.parameters == parameters:
+        available = {key: list(eachResults) for key, eachResults in state.results.items()}
+
+    results = []
+    newResults = []
+    keys = []
+    for key, baseKey, transformation in iterContourSources(glyph):
+        keys.append(key)
+        if available.get(key):
+            results.append(available[key].pop())
+        else:
+            if isCancelled():
+                raise SimulationCancelled
+            results.append(makeContourResult(key, baseKey, transformation, bitUPM, stats))
+            newResults.append(results[-1])
+
+    # whatever is left in the previous state was removed or edited
+    removedResults = [eachResult for eachResults in available.values() for eachResult in eachResults]
+    with timing(stats, 'diff'):
+        toCheck = findCirclesToCheck(results, newResults, removedResults, bitUPM)
+
+    radius = bitUPM/2
+    if toCheck:
+        with timing(stats, 'index'):
+            if fieldResolution is None:
+                index = OutlineIndex([unpackPoints(eachPolyline)
+                                      for eachResult in results
+                                      for eachPolyline in eachResult.polylines],
+                                     cellSize=bitUPM)
+            else:
+                index = getDistanceField(glyph, fieldResolution, ceil(bitUPM),
+                                         outline=(glyph.font.info.unitsPerEm, tuple(keys)))
+        pointInsideCalls = index.pointInsideCalls
+        with timing(stats, 'collisions'):
+            for eachResult, circleIndexes in toCheck:
+                if isCancelled():
+                    raise SimulationCancelled
+                offsetPoints = eachResult.offsetPoints
+                for indexPt in circleIndexes:
+                    center = offsetPoints[2*indexPt], offsetPoints[2*indexPt+1]
+                    eachResult.verdicts[indexPt] = isTouching(center, radius, glyph,
+                                                              index=index, exact=EXACT_COLLISION)
+        if stats is not None:
+            stats.counts['checkedCircles'] = sum(len(circleIndexes) for _, circleIndexes in toCheck)
+            stats.counts['pointInsideCalls'] = index.pointInsideCalls - pointInsideCalls
+
+    state.parameters = parameters
+    state.results = {}
+    simulation = SimulationResult(bitUPM)
+    for eachResult in results:
+        state.results.setdefault(eachResult.key, []).append(eachResult)
+        simulation.contourStarts.append(len(simulation))
+        simulation.centers.extend(eachResult.offsetPoints)
+        simulation.touching.extend(eachResult.verdicts)
+
+    if stats is not None:
+        stats.counts['contours'] = len(results)
+        stats.counts['sampledContours'] = len(newResults)
+        stats.counts['circles'] = len(simulation)
+        stats.counts['errors'] = simulation.errorCount
+        stats.times['total'] = perf_counter() - startTime
+    state.stats = stats
+
+    return simulation
+
+
+def simulationKey(glyph, bodySize=90, bitSize=1, fieldResolution=None, outline=None):
+    """Key of a simulation in the cache and in the store"""
+    if outline is None:
+        outline = outlineKey(glyph)
+    return (FACTORY_NAME, outline, bodySize, bitSize, fieldResolution,
+            ADAPTIVE_FLATTENING, EXACT_COLLISION, EXACT_FIELD, ALGORITHM_VERSION)
+
+
+def getSimulation(glyph, bodySize=90, bitSize=1, fieldResolution=None, state=None, isCancelled=None,
+                  stats=None, cache=None, store=None):
+    """simulateBorder through the cache, shared by all the glyphs: an outline
+       already simulated with the same parameters is not simulated again,
+       even after being edited back. Use it instead of a representation of
+       the glyph, which would keep a result for every parameter ever used.
+
+       With a SimulationStore, results missing from the cache are looked up
+       on disk before being simulated, and saved there once simulated"""
+    if cache is None:
+        cache = simulationCache
+    key = simulationKey(glyph, bodySize, bitSize, fieldResolution)
+
+    def loadOrSimulate():
+        simulation = store.load(key) if store is not None else None
+        if simulation is None:
+            simulation = simulateBorder(glyph, bodySize, bitSize, fieldResolution,
+                                        state=state, isCancelled=isCancelled, stats=stats)
+            if store is not None:
+                store.save(key, simulation)
+        return simulation
+
+    return cache.get(key, loadOrSimulate)
+
+
+def iterSimulation(glyph, bodySize=90, bitSize=1, fieldResolution=None, isCancelled=None):
+    """The circles of simulateBorder as a stream of (contour index, centre,
+       touching), in the same order. Samples, offsets and verdicts are
+       chained generators: the first circle comes out as soon as the outline
+       is indexed, and nothing else grows with the length of the contours,
+       but for the circles of a mirrored component, which are reversed like
+       in makeContourResult. Nothing is cached, use it for consumers that
+       see each circle once"""
+    if isCancelled is None:
+        isCancelled = neverCancelled
+    unitsPerEm = glyph.font.info.unitsPerEm
+    bitUPM = unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize
+    sources = list(iterContourSources(glyph))
+    keys = [key for key, _, _ in sources]
+
+    if fieldResolution is None:
+        index = flattenedIndex(keys, bitUPM)
+    else:
+        index = getDistanceField(glyph, fieldResolution, ceil(bitUPM), outline=(unitsPerEm, tuple(keys)))
+
+    for indexContour, (key, baseKey, transformation) in enumerate(sources):
+        if isCancelled():
+            raise SimulationCancelled
+        if transformation is not None and isIsometry(transformation):
+            # the circles of the base contour moved, as simulateBorder places them
+            centers = transformation.transformPoints(iterOffsets(ContourBreakingPen(bitUPM).iterSamples(baseKey), bitUPM))
+            if isFlipped(transformation):
+                centers.reverse()
+        else:
+            centers = iterOffsets(ContourBreakingPen(bitUPM).iterSamples(key), bitUPM)
+        for eachCenter, touching in iterVerdicts(centers, bitUPM/2, glyph, index):
+            yield indexContour, eachCenter, touching
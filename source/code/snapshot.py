@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# -------------- #
+# Glyph Snapshot #
+# -------------- #
+
+# -- Modules -- #
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.pens.pointInsidePen import PointInsidePen
+from fontTools.pens.boundsPen import BoundsPen
+from fontTools.pens.transformPen import TransformPen
+from fontTools.pens.reverseContourPen import ReverseContourPen
+
+
+# -- Objects, Functions, Procedures -- #
+def isFlipped(transformation):
+    xx, xy, yx, yy = transformation[:4]
+    return xx*yy - xy*yx < 0
+
+
+def transformingPen(pen, transformation):
+    """Draws transformed into pen. Mirrored contours are reversed, so
+       they keep the direction of the contours around them"""
+    transformPen = TransformPen(pen, transformation)
+    if isFlipped(transformation):
+        return ReverseContourPen(transformPen)
+    return transformPen
+
+
+class ContourSnapshot:
+
+    def __init__(self, recording):
+        self.recording = recording
+
+    def draw(self, pen):
+        for operator, points in self.recording:
+            getattr(pen, operator)(*points)
+
+
+class ComponentSnapshot:
+
+    def __init__(self, baseGlyph, transformation):
+        self.baseGlyph = baseGlyph
+        self.transformation = transformation
+
+
+class FontInfoSnapshot:
+
+    def __init__(self, unitsPerEm):
+        self.unitsPerEm = unitsPerEm
+
+
+class FontSnapshot:
+
+    def __init__(self, unitsPerEm):
+        self.info = FontInfoSnapshot(unitsPerEm)
+
+
+class GlyphSnapshot:
+    """Frozen copy of the outline of a glyph, with the bits of the
+       glyph API used by simulateBorder. It can be handed to another
+       thread or process while the original glyph is being edited.
+
+       Components keep the names of their base glyphs, which are
+       snapshots too, found in layer like in the layer of a glyph"""
+
+    def __init__(self, contours, unitsPerEm, name=None, components=(), layer=None):
+        self.name = name
+        self.contours = [ContourSnapshot(eachRecording) for eachRecording in contours]
+        self.components = [ComponentSnapshot(baseGlyph, transformation) for baseGlyph, transformation in components]
+        self.layer = layer if layer is not None else {}
+        self.font = FontSnapshot(unitsPerEm)
+
+    @classmethod
+    def fromGlyph(cls, glyph, layer=None):
+        """The base glyphs of the components are collected in layer,
+           a dict shared by the whole tree of components"""
+        if layer is None:
+            layer = {}
+        contours = []
+        for eachContour in glyph:
+            recorder = RecordingPen()
+            eachContour.draw(recorder)
+            contours.append(tuple(recorder.value))
+
+        components = []
+        for eachComponent in glyph.components:
+            baseName = eachComponent.baseGlyph
+            if baseName not in layer and baseName in glyph.layer:
+                # a component referring back to its own glyph finds None and stops there
+                layer[baseName] = None
+                layer[baseName] = cls.fromGlyph(glyph.layer[baseName], layer)
+            components.append((baseName, tuple(eachComponent.transformation)))
+        return cls(contours, glyph.font.info.unitsPerEm, name=glyph.name, components=components, layer=layer)
+
+    def __iter__(self):
+        return iter(self.contours)
+
+    def __len__(self):
+        return len(self.contours)
+
+    def draw(self, pen):
+        for eachContour in self.contours:
+            eachContour.draw(pen)
+        for eachComponent in self.components:
+            baseGlyph = self.layer.get(eachComponent.baseGlyph)
+            if baseGlyph is not None:
+                baseGlyph.draw(transformingPen(pen, eachComponent.transformation))
+
+    def pointInside(self, point, evenOdd=False):
+        pen = PointInsidePen(glyphSet=None, testPoint=point, evenOdd=evenOdd)
+        self.draw(pen)
+        return pen.getResult()
+
+    @property
+    def bounds(self):
+        pen = BoundsPen(glyphSet=None)
+        self.draw(pen)
+        return pen.bounds
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# ---------------- #
+# Simulation Store #
+# ---------------- #
+
+# -- Modules -- #
+import os
+import sys
+import json
+import sqlite3
+import threading
+from time import time
+from hashlib import sha256
+
+from events import DEFAULT_KEY
+from simulation import SimulationResult
+
+
+# -- Constants -- #
+MAX_BYTES = 256 * 2**20
+SCHEMA_VERSION = 2   # files with an older schema are emptied
+SCHEMA = """CREATE TABLE IF NOT EXISTS simulations (
+    key TEXT PRIMARY KEY,
+    size INTEGER,
+    lastAccess REAL,
+    bitUPM REAL,
+    centers BLOB,
+    touching BLOB,
+    contourStarts TEXT
+)"""
+
+
+# -- Objects, Functions, Procedures -- #
+def defaultStorePath():
+    if sys.platform == 'darwin':
+        folder = os.path.join(os.path.expanduser('~'), 'Library', 'Caches', DEFAULT_KEY)
+    else:
+        folder = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                              DEFAULT_KEY)
+    return os.path.join(folder, 'simulations.sqlite')
+
+
+def hashKey(key):
+    # reprs of tuples of strings and numbers are stable across sessions
+    return sha256(repr(key).encode('utf-8')).hexdigest()
+
+
+class SimulationStore:
+    """Simulation results saved in a SQLite file, keyed by a content hash.
+       Every process opens its own connection, so a batch pool can share
+       the same file.
+
+       The file is bounded by the size of the results it holds: every
+       save past maxBytes drops the results loaded or saved least recently,
+       like the intermediate outlines of an editing session"""
+
+    def __init__(self, path=None, maxBytes=MAX_BYTES):
+        self.path = path or defaultStorePath()
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # sqlite connections cannot cross a fork
+        pid = os.getpid()
+        if pid not in self._connections:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS simulations")
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            connection.execute(SCHEMA)
+            connection.commit()
+            self._connections = {pid: connection}
+        return self._connections[pid]
+
+    def load(self, key):
+        """A SimulationResult or None"""
+        hashedKey = hashKey(key)
+        with self._lock:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT bitUPM, centers, touching, contourStarts FROM simulations WHERE key = ?",
+                (hashedKey, )).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            connection.execute("UPDATE simulations SET lastAccess = ? WHERE key = ?", (time(), hashedKey))
+            connection.commit()
+
+        bitUPM, centers, touching, contourStarts = row
+        simulation = SimulationResult(bitUPM)
+        simulation.centers.frombytes(centers)
+        simulation.touching.frombytes(touching)
+        simulation.contourStarts.extend(json.loads(contourStarts))
+        return simulation
+
+    def save(self, key, simulation):
+        centers = simulation.centers.tobytes()
+        touching = simulation.touching.tobytes()
+        contourStarts = json.dumps(simulation.contourStarts.tolist())
+        size = len(centers) + len(touching) + len(contourStarts)
+        with self._lock:
+            connection = self._connection()
+            connection.execute("INSERT OR REPLACE INTO simulations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (hashKey(key), size, time(), simulation.bitUPM, centers, touching, contourStarts))
+            self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection):
+        excess = connection.execute("SELECT TOTAL(size) FROM simulations").fetchone()[0] - self.maxBytes
+        if excess <= 0:
+            return
+        evicted = []
+        for hashedKey, size in connection.execute("SELECT key, size FROM simulations ORDER BY lastAccess"):
+            evicted.append((hashedKey, ))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM simulations WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def clear(self):
+        with self._lock:
+            connection = self._connection()
+            connection.execute("DELETE FROM simulations")
+            connection.commit()
+
+    def close(self):
+        with self._lock:
+            for eachConnection in self._connections.values():
+                eachConnection.close()
+            self._connections = {}
+
+    def __str__(self):
+        return f"store: {self.hits} hits, {self.misses} misses, {self.evictions} evictions"
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# --------------- #
+# Bit Sizes Sweep #
+# --------------- #
+
+# -- Modules -- #
+from math import ceil
+from functools import partial
+
+from geometry import unpackPoints
+from collision import OutlineIndex
+from scheduler import SimulationCancelled
+from simulation import FROM_MM_TO_PT
+from simulation import SimulationResult, iterContourSources, makeContourResult, simulationKey, iterVerdicts
+from simulation import getDistanceField, neverCancelled
+from cache import simulationCache
+
+
+# -- Objects, Functions, Procedures -- #
+class SharedOutline:
+    """What the simulations of a glyph at different bits have in common:
+       the flattened contours, the flattenings of the curves sampled by
+       ContourBreakingPen and a single collision index, built for the
+       smallest bit and queried with the radius of each. A distance field
+       is clamped near the bit instead, so each bit gets the field
+       simulateBorder would use, shared with it through the cache"""
+
+    def __init__(self, glyph, keys, bitUPMs, fieldResolution=None):
+        self.glyph = glyph
+        self.outline = glyph.font.info.unitsPerEm, tuple(keys)
+        self.fieldResolution = fieldResolution
+        self.cellSize = min(bitUPMs)
+        self.polylines = {}
+        self.flattenings = {}
+        self.index = None
+
+    def contourResult(self, key, baseKey, transformation, bitUPM):
+        """The result of makeContourResult, as simulateBorder builds it"""
+        result = makeContourResult(key, baseKey, transformation, bitUPM,
+                                   polylines=self.polylines.get(key), flattenings=self.flattenings)
+        self.polylines.setdefault(key, result.polylines)
+        return result
+
+    def indexFor(self, bitUPM, results):
+        """The index of the outline, built from the polylines of results
+           like in simulateBorder: they do not depend on the bit"""
+        if self.fieldResolution is not None:
+            return getDistanceField(self.glyph, self.fieldResolution, ceil(bitUPM), outline=self.outline)
+        if self.index is None:
+            self.index = OutlineIndex([unpackPoints(eachPolyline)
+                                       for eachResult in results
+                                       for eachPolyline in eachResult.polylines],
+                                      cellSize=self.cellSize)
+        return self.index
+
+
+def sweepBitSizes(glyph, bitSizes, bodySize=90, fieldResolution=None, isCancelled=None, cache=None, store=None):
+    """SimulationResults of the glyph for each bit size, as a dict in the
+       order of bitSizes. Each result equals the one of simulateBorder, but
+       the outline is flattened and indexed once for all the sizes.
+
+       Sizes found in the cache, or in the store, are not simulated again,
+       and the new results are added to both: moving the bit size of the
+       controller to a swept size is then immediate"""
+    if isCancelled is None:
+        isCancelled = neverCancelled
+    if cache is None:
+        cache = simulationCache
+
+    unitsPerEm = glyph.font.info.unitsPerEm
+    sources = list(iterContourSources(glyph))
+    keys = [key for key, _, _ in sources]
+    outline = (unitsPerEm, tuple(keys))
+    bitUPMs = {bitSize: unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize for bitSize in bitSizes}
+    shared = []
+
+    def simulate(bitSize):
+        # the shared outline is built by the first size missing from the cache and the store
+        if not shared:
+            shared.append(SharedOutline(glyph, keys, bitUPMs.values(), fieldResolution))
+        sharedOutline, = shared
+
+        bitUPM = bitUPMs[bitSize]
+        radius = bitUPM/2
+        results = []
+        for key, baseKey, transformation in sources:
+            if isCancelled():
+                raise SimulationCancelled
+            results.append(sharedOutline.contourResult(key, baseKey, transformation, bitUPM))
+        index = sharedOutline.indexFor(bitUPM, results)
+
+        simulation = SimulationResult(bitUPM)
+        for result in results:
+            if isCancelled():
+                raise SimulationCancelled
+            simulation.contourStarts.append(len(simulation))
+            simulation.centers.extend(result.offsetPoints)
+            verdicts = iterVerdicts(unpackPoints(result.offsetPoints), radius, glyph, index)
+            simulation.touching.extend(touching for _, touching in verdicts)
+        return simulation
+
+    def loadOrSimulate(key, bitSize):
+        simulation = store.load(key) if store is not None else None
+        if simulation is None:
+            simulation = simulate(bitSize)
+            if store is not None:
+                store.save(key, simulation)
+        return simulation
+
+    simulations = {}
+    for bitSize in bitSizes:
+        key = simulationKey(glyph, bodySize, bitSize, fieldResolution, outline=outline)
+        simulations[bitSize] = cache.get(key, partial(loadOrSimulate, key, bitSize))
+    return simulations
+
+
+def largestErrorFreeBitSize(errorCounts):
+    """errorCounts maps bit sizes to the errors they leave. This is the
+       largest error-free size, not the smallest: smaller bits fit in more
+       places, so the size worth knowing is the largest one that still mills
+       the glyph. Bigger bits tend to leave more errors, but the circles move
+       with the bit and the counts are not strictly monotonic, so a size with
+       errors can be followed by one without. The answer is the last size
+       before the first one with errors, None if even the smallest leaves errors"""
+    largest = None
+    for bitSize in sorted(errorCounts):
+        if errorCounts[bitSize]:
+            break
+        largest = bitSize
+    return largest
+
+
+def sweepGlyphs(glyphs, bitSizes, bodySize=90, fieldResolution=None, isCancelled=None, cache=None, store=None):
+    """Largest error-free bit size of each glyph, as {glyphName: bitSize or None}"""
+    largestSizes = {}
+    for eachGlyph in glyphs:
+        simulations = sweepBitSizes(eachGlyph, bitSizes, bodySize, fieldResolution,
+                                    isCancelled=isCancelled, cache=cache, store=store)
+        errorCounts = {bitSize: eachSimulation.errorCount for bitSize, eachSimulation in simulations.items()}
+        largestSizes[eachGlyph.name] = largestErrorFreeBitSize(errorCounts)
+    return largestSizes
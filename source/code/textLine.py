@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# --------- #
+# Text Line #
+# --------- #
+
+# -- Modules -- #
+from geometry import packPoints, unpackPoints
+from collision import OutlineIndex
+from scheduler import SimulationCancelled
+from snapshot import GlyphSnapshot
+from simulation import FROM_MM_TO_PT, SimulationResult
+from simulation import iterContourSources, makeContourResult, iterVerdicts, neverCancelled
+
+
+# -- Constants -- #
+LINE_SPACING = 1.2   # em, between the lines of a text
+
+
+# -- Objects, Functions, Procedures -- #
+def glyphNamesForText(font, text):
+    """Glyph names of each line of text, characters missing from the font are skipped"""
+    cmap = {eachUnicode: eachGlyph.name for eachGlyph in font for eachUnicode in eachGlyph.unicodes}
+    return [[cmap[ord(eachChar)] for eachChar in eachLine if ord(eachChar) in cmap]
+            for eachLine in text.splitlines()]
+
+
+def kerningGroups(font):
+    """Kerning group of each glyph, on the first and on the second side of a pair"""
+    firstGroups, secondGroups = {}, {}
+    for groupName, glyphNames in font.groups.items():
+        if groupName.startswith('public.kern1.'):
+            firstGroups.update(dict.fromkeys(glyphNames, groupName))
+        elif groupName.startswith('public.kern2.'):
+            secondGroups.update(dict.fromkeys(glyphNames, groupName))
+    return firstGroups, secondGroups
+
+
+def kerningValue(font, first, second, groups=None):
+    """Kerning between two glyphs, exceptions first as the UFO spec requires"""
+    if groups is None:
+        groups = kerningGroups(font)
+    firstGroups, secondGroups = groups
+    firstGroup = firstGroups.get(first, first)
+    secondGroup = secondGroups.get(second, second)
+    for eachPair in ((first, second), (first, secondGroup), (firstGroup, second), (firstGroup, secondGroup)):
+        if eachPair in font.kerning:
+            return font.kerning[eachPair]
+    return 0
+
+
+def layoutGlyphs(font, lines):
+    """(glyph, (x, y)) for each glyph of lines of glyph names, set on
+       their advance widths and kerning. Lines go down from the origin"""
+    groups = kerningGroups(font)
+    for indexLine, glyphNames in enumerate(lines):
+        x = 0
+        y = -indexLine * LINE_SPACING * font.info.unitsPerEm
+        previousName = None
+        for eachName in glyphNames:
+            if previousName is not None:
+                x += kerningValue(font, previousName, eachName, groups)
+            glyph = font[eachName]
+            yield glyph, (x, y)
+            x += glyph.width
+            previousName = eachName
+
+
+def translateRecording(recording, dx, dy):
+    return tuple((operator, tuple((x+dx, y+dy) for x, y in points)) for operator, points in recording)
+
+
+class LineSimulation:
+    """Circles of a line of glyphs simulated together, so every glyph is
+       checked against the outlines of its neighbours too. simulations has
+       a SimulationResult for each placement, in line coordinates, and
+       outline is a GlyphSnapshot of the whole line"""
+
+    def __init__(self, bitUPM, outline):
+        self.bitUPM = bitUPM
+        self.outline = outline
+        self.placements = []
+        self.simulations = []
+
+    @property
+    def errorCount(self):
+        return sum(eachSimulation.errorCount for eachSimulation in self.simulations)
+
+
+def simulateLine(placements, unitsPerEm, bodySize=90, bitSize=1, isCancelled=None):
+    """Simulates placements of (glyph, (x, y)) as a single outline, see
+       layoutGlyphs. Contours are flattened and sampled once, however
+       many times they appear in the line, and placed at their offsets
+       in one collision index shared by the whole line"""
+    if isCancelled is None:
+        isCancelled = neverCancelled
+    bitUPM = unitsPerEm * bitSize * FROM_MM_TO_PT / bodySize
+    # placements are walked twice, layoutGlyphs hands a generator
+    placements = list(placements)
+    results = {}
+    glyphKeys = {}
+    for eachGlyph, _ in placements:
+        if eachGlyph.name in glyphKeys:
+            continue
+        glyphKeys[eachGlyph.name] = []
+        for key, baseKey, transformation in iterContourSources(eachGlyph):
+            glyphKeys[eachGlyph.name].append(key)
+            if key not in results:
+                if isCancelled():
+                    raise SimulationCancelled
+                results[key] = makeContourResult(key, baseKey, transformation, bitUPM)
+    placements = [(eachGlyph.name, glyphKeys[eachGlyph.name], offset) for eachGlyph, offset in placements]
+
+    outline = GlyphSnapshot([translateRecording(key, dx, dy) for _, keys, (dx, dy) in placements for key in keys],
+                            unitsPerEm, name='line')
+    index = OutlineIndex([[(x+dx, y+dy) for x, y in unpackPoints(eachPolyline)]
+                          for _, keys, (dx, dy) in placements
+                          for key in keys
+                          for eachPolyline in results[key].polylines],
+                         cellSize=bitUPM)
+
+    lineSimulation = LineSimulation(bitUPM, outline)
+    for glyphName, keys, (dx, dy) in placements:
+        if isCancelled():
+            raise SimulationCancelled
+        simulation = SimulationResult(bitUPM)
+        for key in keys:
+            centers = [(x+dx, y+dy) for x, y in unpackPoints(results[key].offsetPoints)]
+            simulation.contourStarts.append(len(simulation))
+            simulation.centers.extend(packPoints(centers))
+            simulation.touching.extend(touching for _, touching in iterVerdicts(centers, bitUPM/2, outline, index))
+        lineSimulation.placements.append((glyphName, (dx, dy)))
+        lineSimulation.simulations.append(simulation)
+    return lineSimulation
+
+
+def simulateText(font, text, bodySize=90, bitSize=1, isCancelled=None):
+    """LineSimulation of text set with font, lines split on new lines"""
+    return simulateLine(layoutGlyphs(font, glyphNamesForText(font, text)), font.info.unitsPerEm,
+                        bodySize, bitSize, isCancelled)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# --------- #
+# Tool Path #
+# --------- #
+
+# -- Modules -- #
+import pyclipper
+from fontTools.pens.recordingPen import replayRecording
+
+from collision import FlatteningPen
+from simulation import TOLERANCE, ContourBreakingPen, glyphContourKeys
+
+
+# -- Constants -- #
+SCALE = 1000     # pyclipper works on integers, coordinates are kept to a thousandth of unit
+FLATNESS = TOLERANCE/10    # arcs and curves, well below the gap left between circles and outline
+
+
+# -- Objects, Functions, Procedures -- #
+def toClipper(polygons):
+    return [[(round(x*SCALE), round(y*SCALE)) for x, y in eachPolygon] for eachPolygon in polygons]
+
+
+def fromClipper(paths):
+    return [[(x/SCALE, y/SCALE) for x, y in eachPath] for eachPath in paths]
+
+
+def offsetPaths(paths, distance):
+    offset = pyclipper.PyclipperOffset()
+    offset.ArcTolerance = FLATNESS*SCALE
+    offset.AddPaths(paths, pyclipper.JT_ROUND, pyclipper.ET_CLOSEDPOLYGON)
+    return offset.Execute(distance*SCALE)
+
+
+def calcArea(paths):
+    # outer paths are counter-clockwise, holes clockwise and negative
+    return sum(pyclipper.Area(eachPath) for eachPath in paths) / SCALE**2
+
+
+class ToolPath:
+    """Area swept by the tool along the circles of a SimulationResult, as
+       the union of the stroked runs of overlapping circles, and the area
+       left unreachable: the band one bit wide around the outline of the
+       glyph that the tool never sweeps. Both are lists of polygons, filled
+       with the non-zero rule"""
+
+    def __init__(self, glyph, simulation):
+        bitUPM = self.bitUPM = simulation.bitUPM
+        radius = bitUPM/2
+
+        openRuns, closedRuns = [], []
+        for eachRun, closed in simulation.iterRuns(touching=False):
+            if closed:
+                closedRuns.append(eachRun)
+            else:
+                openRuns.append(eachRun)
+
+        # the offset of a polyline by the radius is its Minkowski sum with the disc,
+        # the offsets of all the runs come out already merged
+        offset = pyclipper.PyclipperOffset()
+        offset.ArcTolerance = FLATNESS*SCALE
+        if openRuns:
+            offset.AddPaths(toClipper(openRuns), pyclipper.JT_ROUND, pyclipper.ET_OPENROUND)
+        if closedRuns:
+            offset.AddPaths(toClipper(closedRuns), pyclipper.JT_ROUND, pyclipper.ET_CLOSEDLINE)
+        sweptPaths = offset.Execute(radius*SCALE) if openRuns or closedRuns else []
+
+        pen = FlatteningPen(flatness=FLATNESS)
+        for key in glyphContourKeys(glyph):
+            replayRecording(key, pen)
+        glyphPaths = toClipper(pen.contours)
+
+        # the band between the outline and the centres of the circles,
+        # the tool reaches further out in any case
+        clipper = pyclipper.Pyclipper()
+        band = offsetPaths(glyphPaths, radius + TOLERANCE)
+        if band:
+            clipper.AddPaths(band, pyclipper.PT_SUBJECT, True)
+        for eachPaths in (sweptPaths, glyphPaths):
+            if eachPaths:
+                clipper.AddPaths(eachPaths, pyclipper.PT_CLIP, True)
+        unreachablePaths = clipper.Execute(pyclipper.CT_DIFFERENCE,
+                                           pyclipper.PFT_NONZERO,
+                                           pyclipper.PFT_NONZERO) if band else []
+
+        # circles stay a TOLERANCE away from the outline, and the chords between
+        # them leave scallops along the curves: slivers thinner than both are dropped
+        spacing = ContourBreakingPen(bitUPM).relativeDistance
+        scallop = TOLERANCE + spacing**2 / (8*radius)
+        unreachablePaths = offsetPaths(offsetPaths(unreachablePaths, -scallop), scallop)
+
+        self.swept = fromClipper(sweptPaths)
+        self.unreachable = fromClipper(unreachablePaths)
+        self.sweptArea = calcArea(sweptPaths)
+        self.unreachableArea = calcArea(unreachablePaths)